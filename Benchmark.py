@@ -0,0 +1,199 @@
+import argparse, json, os, platform, subprocess, sys, tempfile
+import random as rd
+import numpy as np
+from time import perf_counter
+from datetime import datetime, timezone
+from Facility_Class import Generate_Stream, Generate_Bias_Stream
+from Meyerson_Algorithm import Meyerson_Algorithm_Online, q_Meyerson_Algorithm_Online, Lloyd_Clustering, Calculate_Costs
+
+""" Helper Functions """
+
+# square area with side 10 * (size / 10)^(1/d), i.e. about 10^(d-1) unit cells per demand (10 in 2d).
+# the same area for all distributions.
+def Benchmark_Area(size: int, dimension: int) -> tuple:
+    side = max(int(np.ceil((size / 10) ** (1 / dimension))) * 10, 10)
+    return tuple([side] * dimension)
+
+# fixed-seed demand stream for one benchmark case.
+def Benchmark_Stream(size: int, area: tuple, distribution: str, seed: int) -> list:
+    rd.seed(seed)
+    if distribution == "uniform":
+        return Generate_Stream(size, area)
+    elif distribution == "bias":
+        return Generate_Bias_Stream(size, area)
+    raise Exception(f"\n\tDistribution '{distribution}' is not valid.")
+
+# runs function repeat times with the random module reseeded, returns the best time and the last result.
+def Time_Function(function, repeat: int, seed: int) -> tuple:
+    times, result = [], None
+    for i in range(0, repeat):
+        rd.seed(seed)
+        start = perf_counter()
+        result = function()
+        times.append(perf_counter() - start)
+    return (min(times), result)
+
+
+""" Benchmark Cases """
+
+def Benchmark_Case(size: int, dimension: int, cost: int, distribution: str, q: float, seed: int, repeat: int,
+                   lloyd_limit: int, draw_limit: int, save_path: str, epsilons: list = ()) -> list[dict]:
+    area = Benchmark_Area(size, dimension)
+    stream = Benchmark_Stream(size, area, distribution, seed)
+    case = {"n": size, "dimension": dimension, "cost": cost, "distribution": distribution}
+    results = []
+
+    def Record(name: str, seconds: float, facilities: list = None, **extra) -> None:
+        item = dict(case, benchmark=name, seconds=seconds, per_demand=seconds / size)
+        if facilities is not None:
+            item.update(facilities=len(facilities), total_cost=float(Calculate_Costs(facilities, cost)))
+        item.update(extra)
+        results.append(item)
+
+    seconds, meyerson = Time_Function(lambda: Meyerson_Algorithm_Online(stream, cost), repeat, seed)
+    Record("meyerson", seconds, meyerson)
+
+    seconds, q_meyerson = Time_Function(lambda: q_Meyerson_Algorithm_Online(q, stream, cost), repeat, seed)
+    Record("q_meyerson", seconds, q_meyerson, q=q)
+
+    # approximate nearest search: speedup and relative change of Calculate_Costs against the exact search.
+    def Record_Approximate(name: str, function, exact: dict, epsilon: float, **extra) -> None:
+        seconds, facilities = Time_Function(function, repeat, seed)
+        total_cost = float(Calculate_Costs(facilities, cost))
+        Record(name, seconds, facilities, epsilon=epsilon, speedup=exact["seconds"] / seconds,
+               cost_delta=total_cost / exact["total_cost"] - 1, **extra)
+
+    exact_meyerson, exact_q_meyerson = results[0], results[1]
+    for epsilon in epsilons:
+        Record_Approximate("meyerson_approx", lambda: Meyerson_Algorithm_Online(stream, cost, epsilon), exact_meyerson, epsilon)
+        Record_Approximate("q_meyerson_approx", lambda: q_Meyerson_Algorithm_Online(q, stream, cost, epsilon), exact_q_meyerson, epsilon, q=q)
+
+    # Calculate_Costs once with the ledger and once recomputing every distance.
+    seconds, _ = Time_Function(lambda: Calculate_Costs(meyerson, cost), repeat, seed)
+    Record("calculate_costs_ledger", seconds)
+    seconds, _ = Time_Function(lambda: Calculate_Costs(list(meyerson), cost), repeat, seed)
+    Record("calculate_costs", seconds)
+
+    # Lloyd_Clustering (Randomize_Center) only supports 2d areas.
+    if dimension == 2 and size <= lloyd_limit:
+        seconds, lloyd = Time_Function(lambda: Lloyd_Clustering(area, stream), repeat, seed)
+        Record("lloyd", seconds, lloyd)
+        exact_lloyd = results[-1]
+        for epsilon in epsilons:
+            Record_Approximate("lloyd_approx", lambda: Lloyd_Clustering(area, stream, epsilon=epsilon), exact_lloyd, epsilon)
+
+    if dimension == 2 and size <= draw_limit:
+        import Draw_Classes
+        Draw_Classes.Save_Path = save_path
+        draw = Draw_Classes.Draw(area, stream, meyerson, Calculate_Costs(meyerson, cost))
+        seconds, _ = Time_Function(lambda: draw.Save(f"benchmark_{size}_{distribution}", dpi=100), repeat, seed)
+        Record("draw_save", seconds)
+
+    return results
+
+# runs every combination of the parameters and returns the JSON document.
+def Run_Benchmarks(sizes: list, dimensions: list, costs: list, distributions: list, q: float = 0.5, seed: int = 0,
+                   repeat: int = 3, lloyd_limit: int = 10000, draw_limit: int = 10000, verbose: bool = True,
+                   epsilons: list = (0.5,)) -> dict:
+    save_path = tempfile.mkdtemp(prefix="facility_benchmark_")
+    results = []
+    for size in sizes:
+        for dimension in dimensions:
+            for cost in costs:
+                for distribution in distributions:
+                    case = Benchmark_Case(size, dimension, cost, distribution, q, seed, repeat, lloyd_limit, draw_limit, save_path, epsilons)
+                    results.extend(case)
+                    if verbose:
+                        for item in case:
+                            approximate = f"\teps={item['epsilon']} x{np.around(item['speedup'], 2)} cost {np.around(100 * item['cost_delta'], 3)}%" if "epsilon" in item else ""
+                            print(f"{item['benchmark']:<24}n={size:<9}d={dimension} f={cost:<5}{distribution:<8}{np.around(item['seconds'], 5)} sec.{approximate}", file=sys.stderr)
+
+    return {"meta": {"timestamp": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+                     "numpy": np.__version__, "machine": platform.machine(), "cpus": os.cpu_count(), "seed": seed,
+                     "repeat": repeat}, "results": results}
+
+
+""" Import Time """
+
+# modules of the headless core, none of them may import the plotting layer.
+Headless_Modules = ("Facility_Class", "Facility_Index", "Facility_Store", "Distance_Kernel", "Metrics", "Meyerson_Algorithm",
+                    "Meyerson_Class", "Meyerson_Refined", "Meyerson_Sharded", "Meyerson_Checkpoint", "Meyerson_Ensemble",
+                    "Meyerson_Service", "Meyerson_Window", "Lloyd_Vectorized", "Lloyd_Mini_Batch", "Demand_IO",
+                    "Demand_Generators", "Experiment_Runner", "Parameter_Sweep", "UFL_Solver")
+Plotting_Modules = ("matplotlib", "PIL")
+
+# imports the module in a fresh interpreter with -X importtime. returns the cumulative import time of the
+# module and whether the plotting layer was loaded with it.
+def Import_Time(module: str) -> dict:
+    check = f"import sys, {module}; print(any(name.split('.')[0] in {Plotting_Modules} for name in sys.modules))"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", check], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    cumulative = None
+    for line in process.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative = int(fields[1].split(":")[-1])
+    return {"module": module, "import_seconds": cumulative / 10**6, "plotting_loaded": process.stdout.strip() == "True"}
+
+# best import time of every module over repeat runs. failed lists the modules loading the plotting layer
+# or taking longer than limit seconds.
+def Run_Import_Benchmarks(modules: tuple = Headless_Modules, repeat: int = 3, limit: float = None) -> dict:
+    results = []
+    for module in modules:
+        runs = [Import_Time(module) for i in range(0, repeat)]
+        results.append(min(runs, key=lambda item: item["import_seconds"]))
+    failed = [item["module"] for item in results
+              if item["plotting_loaded"] or (limit is not None and item["import_seconds"] > limit)]
+    return {"meta": {"python": platform.python_version(), "repeat": repeat, "limit": limit}, "results": results, "failed": failed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the facility location algorithms.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="demand counts, up to 10**7")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[2])
+    parser.add_argument("--costs", type=int, nargs="+", default=[25])
+    parser.add_argument("--distributions", nargs="+", default=["uniform", "bias"], choices=["uniform", "bias"])
+    parser.add_argument("--q", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--lloyd-limit", type=int, default=10000, help="largest n for Lloyd_Clustering")
+    parser.add_argument("--draw-limit", type=int, default=10000, help="largest n for Draw.Save")
+    parser.add_argument("--epsilons", type=float, nargs="*", default=[0.5], help="error factors of the approximate nearest search")
+    parser.add_argument("--imports", action="store_true", help="only check the import times of the headless modules")
+    parser.add_argument("--import-limit", type=float, default=None, help="largest import time of a headless module in sec.")
+    parser.add_argument("--soak", type=int, default=None, help="only run a windowed Meyerson over this many demands, about 20 windows or more")
+    parser.add_argument("--soak-window", type=int, default=100000, help="live demands of the soak window")
+    parser.add_argument("--soak-limit", type=float, default=0.05, help="largest memory growth in the steady state of the soak")
+    parser.add_argument("--output", default=None, help="JSON file, stdout if omitted")
+    args = parser.parse_args()
+
+    if args.imports:
+        report = Run_Import_Benchmarks(repeat=args.repeat, limit=args.import_limit)
+        for item in report["results"]:
+            print(f"{item['module']:<24}{np.around(item['import_seconds'] * 1000, 2)} ms \tplotting: {item['plotting_loaded']}", file=sys.stderr)
+    elif args.soak is not None:
+        from Meyerson_Window import Run_Soak, Soak_Growth
+        area = Benchmark_Area(args.soak_window, 2)
+        samples, rate = Run_Soak(area, args.soak, args.costs[0], args.q, args.soak_window,
+                                 sample_every=max(args.soak // 20, 1), seed=args.seed)
+        report = {"meta": {"python": platform.python_version(), "area": area, "window": args.soak_window, "limit": args.soak_limit},
+                  "samples": [dict(zip(["arrivals", "live", "facilities", "total_cost", "traced_bytes"], sample)) for sample in samples],
+                  "demands_per_second": rate, "growth": Soak_Growth(samples)}
+        print(f"{int(rate)} demands/sec. \tmemory growth in the steady state: {np.around(100 * report['growth'], 2)}%", file=sys.stderr)
+    else:
+        import matplotlib
+        matplotlib.use("Agg")
+
+        report = Run_Benchmarks(args.sizes, args.dimensions, args.costs, args.distributions, args.q, args.seed,
+                                args.repeat, args.lloyd_limit, args.draw_limit, epsilons=args.epsilons)
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    # the import and soak checks fail the run, so they can be used as regression tests.
+    if args.imports and len(report["failed"]) > 0:
+        sys.exit(1)
+    if args.soak is not None and report["growth"] > args.soak_limit:
+        sys.exit(1)
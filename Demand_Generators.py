@@ -0,0 +1,174 @@
+import numpy as np
+from typing import Iterator
+from Facility_Class import Bias_Bounds
+from Lloyd_Vectorized import Get_Generator
+
+""" Helper Functions """
+
+# splits set_size into blocks of at most batch_size rows.
+def Batch_Sizes(set_size: int, batch_size: int) -> Iterator[int]:
+    for start in range(0, set_size, batch_size):
+        yield min(batch_size, set_size - start)
+
+# keeps the points inside [0, area[i]], rounded to integer positions like the other streams if integer is set.
+def Fit_Area(coordinates: np.ndarray, area: tuple, integer: bool = True) -> np.ndarray:
+    coordinates = np.clip(coordinates, 0, np.array(area, dtype=np.float64))
+    return np.rint(coordinates) if integer else coordinates
+
+# per component standard deviations as a (k, d) array, from a scalar, one value per component or a full array.
+def Component_Scales(scales, n_components: int, dimension: int) -> np.ndarray:
+    scales = np.asarray(scales, dtype=np.float64)
+    if scales.ndim == 1:
+        scales = scales[:, None]
+    return np.broadcast_to(scales, (n_components, dimension))
+
+# random mixture components within the area: uniform centers, scales of 2 to 10 percent of the area.
+def Random_Components(area: tuple, n_components: int, rng: np.random.Generator) -> tuple:
+    area = np.array(area, dtype=np.float64)
+    centers = rng.uniform(0, area, size=(n_components, len(area)))
+    scales = rng.uniform(0.02, 0.1, size=(n_components, 1)) * area
+    weights = rng.dirichlet(np.ones(n_components))
+    return (centers, scales, weights)
+
+# pixel weights of an image: dark pixels are dense (like the cities on a map), transparent pixels are empty.
+def Image_Density(img: np.ndarray, invert: bool = False) -> np.ndarray:
+    img = np.asarray(img, dtype=np.float64)
+    if img.ndim == 2:
+        return img if invert else 1 - img / max(img.max(), 1)
+    if img.max() > 1:
+        img = img / 255
+    luminance = img[:, :, :3] @ np.array([0.299, 0.587, 0.114])
+    density = luminance if invert else 1 - luminance
+    if img.shape[2] == 4:
+        density = density * img[:, :, 3]
+    return density
+
+
+""" Generators """
+
+# vectorized Generate_Stream: set_size integer points uniform within [0, area[i]], as an (n, d) array.
+def Generate_Coordinates(set_size: int, area: tuple, seed: int = None, rng: np.random.Generator = None) -> np.ndarray:
+    rng = rng if rng is not None else Get_Generator(seed)
+    return rng.integers(0, np.array(area), size=(set_size, len(area)), endpoint=True).astype(np.float64)
+
+# vectorized Generate_Bias_Stream: integer points uniform within center*(1-bias) and center*(1+bias).
+def Generate_Bias_Coordinates(set_size: int, area: tuple, bias: float = 0.5, seed: int = None,
+                              rng: np.random.Generator = None) -> np.ndarray:
+    rng = rng if rng is not None else Get_Generator(seed)
+    lower, upper = np.array(Bias_Bounds(area, bias)).T
+    return rng.integers(lower, upper, size=(set_size, len(area)), endpoint=True).astype(np.float64)
+
+# the uniform stream as coordinate blocks of batch_size rows, only one block is in memory at a time.
+def Iterate_Coordinates(set_size: int, area: tuple, batch_size: int = 65536, seed: int = None) -> Iterator[np.ndarray]:
+    rng = Get_Generator(seed)
+    for size in Batch_Sizes(set_size, batch_size):
+        yield Generate_Coordinates(size, area, rng=rng)
+
+def Iterate_Bias_Coordinates(set_size: int, area: tuple, bias: float = 0.5, batch_size: int = 65536,
+                             seed: int = None) -> Iterator[np.ndarray]:
+    rng = Get_Generator(seed)
+    for size in Batch_Sizes(set_size, batch_size):
+        yield Generate_Bias_Coordinates(size, area, bias, rng=rng)
+
+# points from a gaussian mixture with the given (k, d) centers, scales and weights. without centers
+# n_components random components are drawn, see Random_Components.
+def Generate_Gaussian_Mixture(set_size: int, area: tuple, centers: np.ndarray = None, scales=None, weights: np.ndarray = None,
+                              n_components: int = 5, integer: bool = True, seed: int = None,
+                              rng: np.random.Generator = None) -> np.ndarray:
+    rng = rng if rng is not None else Get_Generator(seed)
+    if centers is None:
+        centers, random_scales, random_weights = Random_Components(area, n_components, rng)
+        scales = random_scales if scales is None else scales
+        weights = random_weights if weights is None else weights
+    centers = np.asarray(centers, dtype=np.float64)
+    scales = Component_Scales(np.array(area) / 20 if scales is None else scales, len(centers), centers.shape[1])
+    weights = np.full(len(centers), 1 / len(centers)) if weights is None else np.asarray(weights) / np.sum(weights)
+
+    component = rng.choice(len(centers), size=set_size, p=weights)
+    coordinates = centers[component] + rng.standard_normal((set_size, centers.shape[1])) * scales[component]
+    return Fit_Area(coordinates, area, integer)
+
+# points distributed like the density of an image (e.g. a population map), see Image_Density. the image
+# covers the whole area like in Draw_Map, the first row of pixels is the top of the area. img is either
+# an array or the name of an image in Draw_Classes.Save_Path.
+def Generate_Raster(set_size: int, area: tuple, img, invert: bool = False, integer: bool = True, seed: int = None,
+                    rng: np.random.Generator = None) -> np.ndarray:
+    rng = rng if rng is not None else Get_Generator(seed)
+    if isinstance(img, str):
+        # matplotlib is only needed to read the image.
+        from Draw_Classes import Load_Image, Format_Image_Path
+        img = Load_Image(Format_Image_Path(img))
+    density = Image_Density(img, invert)
+    if np.sum(density) <= 0:
+        raise Exception("\n\tThe image has no density.")
+
+    height, width = density.shape
+    pixel = rng.choice(height * width, size=set_size, p=(density / np.sum(density)).ravel())
+    row, column = np.divmod(pixel, width)
+    # uniform position within the pixel.
+    x = (column + rng.random(set_size)) * area[0] / width
+    y = (height - row - rng.random(set_size)) * area[1] / height
+    return Fit_Area(np.column_stack([x, y]), area, integer)
+
+# gaussian mixture whose centers move linearly from start_centers to end_centers over the stream. the
+# point at position offset + i of a stream of total points is drawn with the centers at time (offset + i) / (total - 1),
+# so a stream can be generated in blocks.
+def Generate_Drifting_Mixture(set_size: int, area: tuple, start_centers: np.ndarray, end_centers: np.ndarray, scales=None,
+                              weights: np.ndarray = None, integer: bool = True, offset: int = 0, total: int = None,
+                              seed: int = None, rng: np.random.Generator = None) -> np.ndarray:
+    rng = rng if rng is not None else Get_Generator(seed)
+    start_centers, end_centers = np.asarray(start_centers, dtype=np.float64), np.asarray(end_centers, dtype=np.float64)
+    scales = Component_Scales(np.array(area) / 20 if scales is None else scales, len(start_centers), start_centers.shape[1])
+    weights = np.full(len(start_centers), 1 / len(start_centers)) if weights is None else np.asarray(weights) / np.sum(weights)
+    total = set_size if total is None else total
+
+    time = (offset + np.arange(0, set_size)) / max(total - 1, 1)
+    component = rng.choice(len(start_centers), size=set_size, p=weights)
+    centers = start_centers[component] + time[:, None] * (end_centers[component] - start_centers[component])
+    coordinates = centers + rng.standard_normal((set_size, start_centers.shape[1])) * scales[component]
+    return Fit_Area(coordinates, area, integer)
+
+def Iterate_Drifting_Mixture(set_size: int, area: tuple, start_centers: np.ndarray, end_centers: np.ndarray, scales=None,
+                             weights: np.ndarray = None, batch_size: int = 65536, seed: int = None) -> Iterator[np.ndarray]:
+    rng = Get_Generator(seed)
+    for offset in range(0, set_size, batch_size):
+        yield Generate_Drifting_Mixture(min(batch_size, set_size - offset), area, start_centers, end_centers, scales,
+                                        weights, offset=offset, total=set_size, rng=rng)
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from Facility_Class import Generate_Stream
+
+    test_area = (1000, 1000)
+    test_size = 10**7
+
+    start = perf_counter()
+    test_coordinates = Generate_Coordinates(test_size, test_area, seed=1)
+    generator_time = perf_counter() - start
+    assert test_coordinates.min() >= 0 and test_coordinates.max() <= 1000
+
+    test_bias = Generate_Bias_Coordinates(test_size, test_area, 0.6, seed=1)
+    assert test_bias.min() == 200 and test_bias.max() == 800
+
+    start = perf_counter()
+    test_mixture = Generate_Gaussian_Mixture(test_size, test_area, [[200, 200], [700, 600]], [20, 50], [0.25, 0.75], seed=1)
+    mixture_time = perf_counter() - start
+    assert abs(np.mean(test_mixture[:, 0] < 450) - 0.25) < 0.01
+
+    # a raster with a single dense quadrant (bottom left of the area).
+    test_raster = np.ones((40, 40))
+    test_raster[20:, :20] = 0
+    test_points = Generate_Raster(10**5, test_area, test_raster, integer=False, seed=1)
+    assert np.all(test_points < 500 + 1e-9)
+
+    test_drift = np.concatenate(list(Iterate_Drifting_Mixture(10**5, test_area, [[100, 100]], [[900, 900]], 10, batch_size=30000, seed=1)))
+    assert np.mean(test_drift[:1000]) < 150 and np.mean(test_drift[-1000:]) > 850
+
+    start = perf_counter()
+    Generate_Stream(10**5, test_area)
+    stream_time = (perf_counter() - start) * test_size / 10**5
+
+    print(f"Generate_Coordinates: \t{np.around(test_size / generator_time / 10**6, 2)} M points/sec.")
+    print(f"Generate_Gaussian_Mixture: \t{np.around(test_size / mixture_time / 10**6, 2)} M points/sec.")
+    print(f"Generate_Stream: \t{np.around(test_size / stream_time / 10**6, 2)} M points/sec.")
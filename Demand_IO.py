@@ -0,0 +1,172 @@
+import os
+import numpy as np
+from itertools import islice
+from typing import Iterable, Iterator
+from Facility_Store import Demand_Store, Build_Store
+from Distance_Kernel import As_Coordinates
+
+""" Helper Functions """
+
+# names of the coordinate columns, x, y, z and x3, x4, ... for higher dimensions.
+def Column_Names(dimension: int) -> list[str]:
+    return [["x", "y", "z"][i] if i < 3 else f"x{i}" for i in range(0, dimension)]
+
+# columns of a columnar directory, in the order of Column_Names.
+def Column_Paths(path: str, dimension: int) -> list[str]:
+    return [os.path.join(path, f"{name}.npy") for name in Column_Names(dimension)]
+
+def Get_Dimension(path: str) -> int:
+    dimension = 0
+    while os.path.exists(os.path.join(path, f"{Column_Names(dimension + 1)[-1]}.npy")):
+        dimension += 1
+    return dimension
+
+# store of a result: the store of a store-backed run or one built from the demands and facilities. a plain
+# list of views (or a View_List over only some rows) is copied, Build_Store keeps the assignments of views.
+def Result_Store(demands: list, facilities: list) -> Demand_Store:
+    if len(demands) > 0 and hasattr(demands, "store") and demands.indices is None:
+        return demands.store
+    return Build_Store(demands, facilities)
+
+
+""" Readers """
+
+# reads the coordinates of a csv file in blocks of batch_size rows. columns selects the coordinate
+# columns (by default all of them), header skips the first line.
+def Iterate_Csv_Batches(path: str, batch_size: int = 65536, columns: tuple = None, delimiter: str = ",",
+                        header: bool = True) -> Iterator[np.ndarray]:
+    with open(path) as file:
+        if header:
+            next(file, None)
+        while True:
+            lines = list(islice(file, batch_size))
+            if len(lines) == 0:
+                return
+            yield np.loadtxt(lines, dtype=np.float64, delimiter=delimiter, usecols=columns, ndmin=2)
+
+# reads an (n, d) .npy file as a memory map, only one block is loaded at a time.
+def Iterate_Npy_Batches(path: str, batch_size: int = 65536) -> Iterator[np.ndarray]:
+    coordinates = np.load(path, mmap_mode="r")
+    for start in range(0, len(coordinates), batch_size):
+        yield np.array(coordinates[start:start + batch_size], dtype=np.float64)
+
+# reads a columnar directory (one .npy file per coordinate, see Write_Columns) in blocks of batch_size rows.
+def Iterate_Column_Batches(path: str, batch_size: int = 65536) -> Iterator[np.ndarray]:
+    columns = [np.load(column, mmap_mode="r") for column in Column_Paths(path, Get_Dimension(path))]
+    for start in range(0, len(columns[0]), batch_size):
+        yield np.stack([column[start:start + batch_size] for column in columns], axis=1).astype(np.float64)
+
+# picks the reader by the file: .csv, .npy or a columnar directory.
+def Iterate_File_Batches(path: str, batch_size: int = 65536) -> Iterator[np.ndarray]:
+    if os.path.isdir(path):
+        return Iterate_Column_Batches(path, batch_size)
+    elif path.endswith(".npy"):
+        return Iterate_Npy_Batches(path, batch_size)
+    elif path.endswith(".csv"):
+        return Iterate_Csv_Batches(path, batch_size)
+    raise Exception(f"\n\tThe file '{path}' is not a csv, npy or column directory.")
+
+def Read_Coordinates(path: str) -> np.ndarray:
+    batches = list(Iterate_File_Batches(path))
+    return np.concatenate(batches) if len(batches) > 0 else np.zeros((0, 2))
+
+
+""" Writers """
+
+# writes coordinate blocks (or Demands) to a csv file, one block at a time.
+def Write_Csv(path: str, batches: Iterable[np.ndarray], header: bool = True, delimiter: str = ",", fmt: str = "%.10g") -> int:
+    rows = 0
+    with open(path, "w") as file:
+        for i, batch in enumerate(batches):
+            batch = As_Coordinates(batch)
+            if i == 0 and header:
+                file.write(delimiter.join(Column_Names(batch.shape[1])) + "\n")
+            np.savetxt(file, batch, fmt=fmt, delimiter=delimiter)
+            rows += len(batch)
+    return rows
+
+# writes coordinate blocks into a single .npy file. the total size has to be known up front, the blocks
+# are written through a memory map.
+def Write_Npy(path: str, batches: Iterable[np.ndarray], size: int, dimension: int = 2) -> int:
+    output = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(size, dimension))
+    rows = 0
+    for batch in batches:
+        batch = As_Coordinates(batch)
+        output[rows:rows + len(batch)] = batch
+        rows += len(batch)
+    output.flush()
+    del output
+    if rows != size:
+        raise Exception(f"\n\tExpected {size} rows, got {rows}.")
+    return rows
+
+# columnar layout: one .npy file per coordinate (x.npy, y.npy, ...) in the directory path, plus
+# optional extra columns like the facility of every demand.
+def Write_Columns(path: str, coordinates: np.ndarray, **extra: np.ndarray) -> None:
+    coordinates = As_Coordinates(coordinates)
+    os.makedirs(path, exist_ok=True)
+    for column, values in zip(Column_Paths(path, coordinates.shape[1]), coordinates.T):
+        np.save(column, values)
+    for name, values in extra.items():
+        np.save(os.path.join(path, f"{name}.npy"), values)
+
+# writes the result of an algorithm run: the demands with the index of their facility, and the facilities.
+# as csv (result.csv with the columns x, y, ..., facility plus result_facilities.csv) or in the columnar
+# layout (a directory with facility.npy next to the coordinates and a facilities subdirectory).
+def Write_Result(path: str, demands: list, facilities: list, format: str = "columns", batch_size: int = 65536) -> None:
+    store = Result_Store(demands, facilities)
+    coordinates = store.coordinates[:store.size]
+    assignment = store.assignment[:store.size]
+    facility_coordinates = store.facility_coordinates[:store.facility_size]
+
+    if format == "columns":
+        Write_Columns(path, coordinates, facility=assignment)
+        Write_Columns(os.path.join(path, "facilities"), facility_coordinates)
+    elif format == "csv":
+        with open(f"{path}.csv", "w") as file:
+            file.write(",".join(Column_Names(store.dimension) + ["facility"]) + "\n")
+            for start in range(0, store.size, batch_size):
+                block = np.column_stack([coordinates[start:start + batch_size], assignment[start:start + batch_size]])
+                np.savetxt(file, block, fmt=["%.10g"] * store.dimension + ["%d"], delimiter=",")
+        Write_Csv(f"{path}_facilities.csv", [facility_coordinates])
+    else:
+        raise Exception(f"\n\tFormat '{format}' is not valid.")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from time import perf_counter
+    from Demand_Generators import Generate_Coordinates, Iterate_Coordinates
+    from Meyerson_Class import Meyerson
+
+    test_area = (1000, 1000)
+    test_size = 10**6
+    test_directory = tempfile.mkdtemp(prefix="demand_io_")
+    test_coordinates = Generate_Coordinates(test_size, test_area, seed=1)
+
+    # every format has to give back the same coordinates.
+    paths = {"csv": os.path.join(test_directory, "demands.csv"), "npy": os.path.join(test_directory, "demands.npy"),
+             "columns": os.path.join(test_directory, "demands")}
+    Write_Csv(paths["csv"], Iterate_Coordinates(test_size, test_area, seed=1))
+    Write_Npy(paths["npy"], Iterate_Coordinates(test_size, test_area, seed=1), test_size)
+    Write_Columns(paths["columns"], test_coordinates)
+
+    for name, path in paths.items():
+        start = perf_counter()
+        rows = 0
+        for batch in Iterate_File_Batches(path):
+            assert np.array_equal(batch, test_coordinates[rows:rows + len(batch)])
+            rows += len(batch)
+        assert rows == test_size
+        print(f"{name}: \t{np.around(test_size / (perf_counter() - start) / 10**6, 2)} M points/sec.")
+
+    test_meyerson = Meyerson(test_area, 25, 1, Demand_Store(2))
+    test_meyerson.Add_Many(test_coordinates[:10000])
+    Write_Result(os.path.join(test_directory, "result"), test_meyerson.demands, test_meyerson.facilities)
+    Write_Result(os.path.join(test_directory, "result"), test_meyerson.demands, test_meyerson.facilities, "csv")
+    assert np.array_equal(np.load(os.path.join(test_directory, "result", "facility.npy")), test_meyerson.store.assignment[:10000])
+    # a plain list of the views keeps the assignments as well.
+    Write_Result(os.path.join(test_directory, "result_list"), list(test_meyerson.demands), list(test_meyerson.facilities))
+    assert np.array_equal(np.load(os.path.join(test_directory, "result_list", "facility.npy")), test_meyerson.store.assignment[:10000])
+    assert np.array_equal(Read_Coordinates(os.path.join(test_directory, "result", "facilities")),
+                          Read_Coordinates(os.path.join(test_directory, "result_facilities.csv")))
@@ -0,0 +1,84 @@
+import numpy as np
+import Metrics
+
+""" Helper Functions """
+
+# converts points (tuples, Demands or Facilities) into a contiguous float64 array of shape (n, d).
+# sequences of a columnar store already carry their coordinates as an array.
+def As_Coordinates(points) -> np.ndarray:
+    if isinstance(points, np.ndarray):
+        return np.ascontiguousarray(points, dtype=np.float64).reshape(len(points), -1)
+    if hasattr(points, "coordinates"):
+        return points.coordinates
+    if len(points) == 0:
+        return np.empty((0, 0), dtype=np.float64)
+    if hasattr(points[0], "position"):
+        points = [point.position for point in points]
+    return np.array(points, dtype=np.float64, ndmin=2)
+
+# rounds the distances once at the end, None keeps the full precision.
+def Round_Distances(distances: np.ndarray, decimals: int = None) -> np.ndarray:
+    if decimals is None:
+        return distances
+    return np.around(distances, decimals=decimals)
+
+
+# squared lengths of the rows of an (n, d) difference array. for fewer than 8 columns numpy sums a row
+# left to right, so adding the columns one by one gives the same bits without the slow reduction over axis 1.
+def Squared_Norms(difference: np.ndarray) -> np.ndarray:
+    if difference.shape[1] >= 8:
+        return np.sum(difference * difference, axis=1)
+    squared = difference[:, 0] * difference[:, 0]
+    for j in range(1, difference.shape[1]):
+        squared += difference[:, j] * difference[:, j]
+    return squared
+
+
+""" Distance Kernels """
+
+# distances from a single point to many points (one-to-many).
+def Point_Distances(point, points, decimals: int = None) -> np.ndarray:
+    if len(points) == 0:
+        return np.empty(0, dtype=np.float64)
+    difference = As_Coordinates(points) - np.asarray(point, dtype=np.float64)
+    if Metrics.Enabled:
+        Metrics.Increment("distance_evaluations", len(difference))
+    return Round_Distances(np.sqrt(Squared_Norms(difference)), decimals)
+
+# distances between all pairs of two point sets (many-to-many), returns an array of shape (n, m).
+# the rows are processed in blocks, so the intermediate differences stay small.
+def Pairwise_Distances(points_1, points_2, decimals: int = None, block_size: int = 4096) -> np.ndarray:
+    points_1, points_2 = As_Coordinates(points_1), As_Coordinates(points_2)
+    distances = np.empty((len(points_1), len(points_2)), dtype=np.float64)
+    if Metrics.Enabled:
+        Metrics.Increment("distance_evaluations", distances.size)
+
+    for start in range(0, len(points_1), block_size):
+        difference = points_1[start:start + block_size, None, :] - points_2[None, :, :]
+        distances[start:start + block_size] = np.sqrt(np.sum(difference * difference, axis=2))
+
+    return Round_Distances(distances, decimals)
+
+# distance of each point in points_1 to the point with the same index in points_2.
+def Paired_Distances(points_1, points_2, decimals: int = None) -> np.ndarray:
+    difference = As_Coordinates(points_1) - As_Coordinates(points_2)
+    if Metrics.Enabled:
+        Metrics.Increment("distance_evaluations", len(difference))
+    return Round_Distances(np.sqrt(Squared_Norms(difference)), decimals)
+
+
+if __name__ == "__main__":
+    # testing the kernels against the per-pair norm.
+    test_points = np.random.default_rng(0).integers(0, 50, size=(200, 2))
+    test_centers = [(1.5, 2.25), (30, 40), (49, 0)]
+
+    test_pairwise = Pairwise_Distances(test_points, test_centers, 4, block_size=64)
+    for i, point in enumerate(test_points):
+        assert np.array_equal(test_pairwise[i], Point_Distances(point, test_centers, 4))
+        for j, center in enumerate(test_centers):
+            assert test_pairwise[i, j] == np.around(np.linalg.norm(point - np.array(center)), 4)
+
+    # the column sums have to give the same bits as the reduction they replace.
+    for dimension in range(1, 10):
+        test_difference = np.random.default_rng(dimension).uniform(-1000, 1000, size=(5000, dimension))
+        assert np.array_equal(Squared_Norms(test_difference), np.sum(test_difference * test_difference, axis=1))
@@ -1,8 +1,15 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.image as image
-import os, io
+from matplotlib.collections import LineCollection
+from matplotlib.transforms import Bbox
+import os, io, shutil, subprocess
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
 from Facility_Class import Facility, Demand
+from Distance_Kernel import As_Coordinates
+import Metrics
 
 Save_Path = "Tests/Test_Meyerson/"
 
@@ -11,9 +18,10 @@ Save_Path = "Tests/Test_Meyerson/"
 
 # split the x and y coordinates into two list. used for plotting.
 def Split_Position(points: list) -> tuple:
-    x_pos = [point.position[0] for point in points]
-    y_pos = [point.position[1] for point in points]
-    return (x_pos, y_pos)
+    if len(points) == 0:
+        return ([], [])
+    coordinates = As_Coordinates(points)
+    return (coordinates[:, 0], coordinates[:, 1])
 
 # split x and y coordinates into two list for all demands, that a facility serves. used for plotting.
 def Get_Service_Connections(facility: Facility) -> tuple:
@@ -21,10 +29,67 @@ def Get_Service_Connections(facility: Facility) -> tuple:
     y_pos = [(point.position[1], facility.position[1]) for point in facility.service]
     return (x_pos, y_pos)
 
+# all service connections as line segments of shape (m, 2, 2), built from the coordinate arrays.
+def Get_Service_Segments(facilities: list) -> np.ndarray:
+    segments = [np.zeros((0, 2, 2))]
+    for facility in facilities:
+        if len(facility.service) == 0:
+            continue
+        demands = As_Coordinates(facility.service)[:, :2]
+        segments.append(np.stack([demands, np.broadcast_to(np.asarray(facility.position[:2], dtype=np.float64), demands.shape)], axis=1))
+    return np.concatenate(segments)
+
+# sorted random subset of max_items of the indices 0, ..., size - 1, always the same for a given size.
+def Sample_Indices(size: int, max_items: int) -> np.ndarray:
+    return np.sort(np.random.default_rng(0).choice(size, size=max_items, replace=False))
+
+# draws demands, facilities and all service connections with one scatter call per point type and a single
+# LineCollection for the connections. for large instances max_points limits the demands and connections
+# drawn, and rasterized renders the point and line artists as a bitmap in vector formats.
+def Plot_Result(axes: plt.Axes, demands: list, facilities: list, line_style: str = "-", line_zorder: int = -2,
+                max_points: int = None, rasterized: bool = False) -> None:
+    demand_coordinates = As_Coordinates(demands)[:, :2] if len(demands) > 0 else np.zeros((0, 2))
+    facility_coordinates = As_Coordinates(facilities)[:, :2] if len(facilities) > 0 else np.zeros((0, 2))
+    segments = Get_Service_Segments(facilities)
+
+    if max_points is not None and len(demands) > max_points:
+        # one sample of the demands, the connections drawn are the ones of the sampled demands. the segments
+        # are in the order of the service lists, the demand objects are shared with other results of a comparison.
+        keep = Sample_Indices(len(demands), max_points)
+        rows = {demand: row for row, demand in enumerate(demand for facility in facilities for demand in facility.service)}
+        demand_coordinates = demand_coordinates[keep]
+        segments = segments[[rows[demands[i]] for i in keep.tolist() if demands[i] in rows]]
+
+    # demand will be shown as black dots, facilities as red stars
+    axes.scatter(demand_coordinates[:, 0], demand_coordinates[:, 1], color="black", s=50, zorder=2, rasterized=rasterized)
+    axes.scatter(facility_coordinates[:, 0], facility_coordinates[:, 1], color="red", s=50, marker="*", zorder=2, rasterized=rasterized)
+
+    # the lines show, which facility serves which demand point.
+    lines = LineCollection(segments, colors="grey", linestyles=line_style, zorder=line_zorder, rasterized=rasterized)
+    axes.add_collection(lines, autolim=False)
+
 # Returns all the demand points from all facilities in a single list.
 def Extract_Demands(result: list) -> list[Demand]:
     return [demand for facility in result[0] for demand in facility.service]
 
+# sets the title of the plot window. the canvas only has a manager (and a window) with pyplot figures.
+def Set_Window_Title(figure: plt.Figure, title: str) -> None:
+    if figure.canvas.manager is not None:
+        figure.canvas.manager.set_window_title(title)
+
+# path of a background image in Save_Path, the extension is optional.
+def Format_Image_Path(img: str) -> str:
+    if ".png" not in img:
+        img += ".png"
+    return os.path.join(Save_Path, img)
+
+# background images are read only once per path.
+Image_Cache = {}
+def Load_Image(path: str) -> np.ndarray:
+    if path not in Image_Cache:
+        Image_Cache[path] = image.imread(path)
+    return Image_Cache[path]
+
 # returns a percent value as a string.
 def Percent(value_1, value_2) -> str:
     value = str(np.around(value_1/value_2 - 1, decimals=4)).translate({ord("."): None})
@@ -33,38 +98,27 @@ def Percent(value_1, value_2) -> str:
 """ Classes Plot """
 
 class Draw:
-    def __init__(self, area: tuple, demands: list, facilites: list, costs: float = 0) -> None:
+    def __init__(self, area: tuple, demands: list, facilites: list, costs: float = 0, max_points: int = None, rasterized: bool = False) -> None:
         self.area = area
         self.demands = demands
         self.facilities = facilites
         self.costs = costs
+        self.max_points = max_points
+        self.rasterized = rasterized
 
     def Generate_Plot(self) -> plt:
         # Preparing the plot.
         figure, axes = plt.subplots()
         figure.set_size_inches(10, 7)
-        figure.canvas.set_window_title("Facility Location")
+        Set_Window_Title(figure, "Facility Location")
         
         axes.set_aspect("equal")
         plt.grid(True, which="both")
         plt.xlim([-1, self.area[0] + 1])
         plt.ylim([-1, self.area[1] + 1])
 
-        # get data points to plot.
-        x_demand, y_demand = Split_Position(self.demands)
-        x_facilities, y_facilities = Split_Position(self.facilities)
-
-        # demand will be shown as black dots, facilities as red stars
-        plt.scatter(x_demand, y_demand , color="black", s=50, zorder=2)
-        plt.scatter(x_facilities, y_facilities , color="red", s=50, marker="*", zorder=2)
-
-        # plot the lines to see, which facility serves which demand point.
-        for facility in self.facilities:
-            # get the coordinates for all the demands served.
-            x_service, y_service = Get_Service_Connections(facility)
-
-            for i in range(0, len(x_service)):
-                plt.plot(x_service[i], y_service[i], color="grey", zorder=-2)
+        # plot demands, facilities and the service connections.
+        Plot_Result(axes, self.demands, self.facilities, max_points=self.max_points, rasterized=self.rasterized)
 
         return plt
 
@@ -80,6 +134,7 @@ class Draw:
         plt_self.show()
         plt_self.close()
 
+    @Metrics.Timed("draw_seconds", kind="Draw")
     def Save(self, file_name: str, dpi: int = 300, format: str = "png") -> None:
         # formating the save path.
         file_name = f"{file_name}.{format}"
@@ -98,19 +153,22 @@ class Draw:
 
 
 class Draw_Comparison:
-    def __init__(self, area: tuple, facility_cost: int, sample_size: int, meyerson: list, q_meyerson: list, lloyd: list) -> None:
+    def __init__(self, area: tuple, facility_cost: int, sample_size: int, meyerson: list, q_meyerson: list, lloyd: list,
+                 max_points: int = None, rasterized: bool = False) -> None:
         self.area = area
         self.costs = facility_cost
         self.sample_size = sample_size
         self.result_1 = meyerson
         self.result_2 = q_meyerson
         self.result_3 = lloyd
+        self.max_points = max_points
+        self.rasterized = rasterized
     
     def Generate_Plot(self) -> plt:
         # Preparing the plot.
         figure, ((ax_1, ax_2), (ax_3, ax_4)) = plt.subplots(2 ,2)
         figure.set_size_inches(10, 7)
-        figure.canvas.set_window_title("Facility Location")
+        Set_Window_Title(figure, "Facility Location")
 
         # generating the plots.
         axes = [(ax_1, "Meyerson", self.result_1), (ax_2, "q-Meyerson", self.result_2), (ax_3, "Lloyd", self.result_3)]
@@ -121,19 +179,8 @@ class Draw_Comparison:
             ax[0].set(xlim=(-1, self.area[0] + 1), ylim=(-1, self.area[1] + 1))
             ax[0].set_title(ax[1])
 
-            # extract points.
-            x_facilities, y_facilities = Split_Position(ax[2][0])
-            x_demand, y_demand = Split_Position(Extract_Demands(ax[2]))
-
-            ax[0].scatter(x_demand, y_demand , color="black", s=50, zorder=2)
-            ax[0].scatter(x_facilities, y_facilities , color="red", s=50, marker="*", zorder=2)
-
-            for facility in ax[2][0]:
-                # get the coordinates for all the demands served.
-                x_service, y_service = Get_Service_Connections(facility)
-
-                for i in range(0, len(x_service)):
-                    ax[0].plot(x_service[i], y_service[i], color="grey", zorder=-2)
+            # plot demands, facilities and the service connections.
+            Plot_Result(ax[0], Extract_Demands(ax[2]), ax[2][0], max_points=self.max_points, rasterized=self.rasterized)
 
 
         # formating the textbox
@@ -155,6 +202,7 @@ class Draw_Comparison:
         plt_compare.show()
         plt_compare.close()
 
+    @Metrics.Timed("draw_seconds", kind="Draw_Comparison")
     def Save(self, file_name: str, dpi: int = 300, format: str = "png") -> None:
         # formating the save path.
         file_name = f"{file_name}.{format}"
@@ -166,48 +214,33 @@ class Draw_Comparison:
 
 
 class Draw_Map:
-    def __init__(self, area: tuple, demands: list, facilities: list, img: str, costs: float = 0) -> None:
+    def __init__(self, area: tuple, demands: list, facilities: list, img: str, costs: float = 0, max_points: int = None, rasterized: bool = False) -> None:
         self.area = area
         self.demands = demands
         self.facilities = facilities
         self.img = img
         self.costs = costs
+        self.max_points = max_points
+        self.rasterized = rasterized
     
     def Format_Image(self) -> str:
-        if ".png" not in self.img:
-            self.img += ".png"
-        self.img = os.path.join(Save_Path, self.img)
-        print(self.img)
-        return self.img
+        return Format_Image_Path(self.img)
 
     def Generate_Plot(self) -> plt:
         # Preparing the plot.
         figure, axes = plt.subplots()
         figure.set_size_inches(10, 7)
-        figure.canvas.set_window_title("Facility Location")
+        Set_Window_Title(figure, "Facility Location")
 
         axes.set_aspect("auto")
         plt.xlim([-1, self.area[0] + 1])
         plt.ylim([-1, self.area[1] + 1])
 
-        image_cache = image.imread(self.Format_Image())
+        image_cache = Load_Image(self.Format_Image())
         axes.imshow(image_cache, extent=[0, self.area[0] ,0, self.area[1]])
 
-        # get data points to plot.
-        x_demand, y_demand = Split_Position(self.demands)
-        x_facilities, y_facilities = Split_Position(self.facilities)
-
-        # demand will be shown as black dots, facilities as red stars
-        plt.scatter(x_demand, y_demand , color="black", s=50, zorder=2)
-        plt.scatter(x_facilities, y_facilities , color="red", s=50, marker="*", zorder=2)
-
-        # plot the lines to see, which facility serves which demand point.
-        for facility in self.facilities:
-            # get the coordinates for all the demands served.
-            x_service, y_service = Get_Service_Connections(facility)
-
-            for i in range(0, len(x_service)):
-                plt.plot(x_service[i], y_service[i], "--", color="grey", zorder=1)
+        # plot demands, facilities and the service connections.
+        Plot_Result(axes, self.demands, self.facilities, "--", 1, self.max_points, self.rasterized)
 
         return plt
 
@@ -217,6 +250,7 @@ class Draw_Map:
         plt_map.show()
         plt_map.close()
 
+    @Metrics.Timed("draw_seconds", kind="Draw_Map")
     def Save(self, file_name: str, dpi: int = 300, format: str = "png") -> None:
         # formating the save path.
         file_name = f"{file_name}.{format}"
@@ -231,4 +265,110 @@ class Draw_Map:
         plt_map = self.Generate_Plot()
         plt_map.title(title_str)
         plt_map.savefig(path, dpi = dpi, format = format, bbox_inches = "tight")
-        plt_map.close()
\ No newline at end of file
+        plt_map.close()
+
+
+# keeps a single Agg figure and only draws what changed since the last frame on top of the previous
+# frame, so a slide show of n demands costs O(n) drawing work instead of O(n^2). only the title area
+# is restored from the cached (empty) background before it is redrawn.
+class Draw_Animation:
+    def __init__(self, area: tuple, img: str = None, dpi: int = 100) -> None:
+        self.area = area
+        self.demand_count = 0
+        self.facility_count = 0
+
+        self.figure = Figure(figsize=(10, 7), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots()
+        self.axes.set(xlim=(-1, area[0] + 1), ylim=(-1, area[1] + 1))
+
+        if img is None:
+            self.axes.set_aspect("equal")
+            self.axes.grid(True, which="both")
+            line_style, line_zorder = "-", -2
+        else:
+            self.axes.set_aspect("auto")
+            self.axes.imshow(Load_Image(Format_Image_Path(img)), extent=[0, area[0], 0, area[1]])
+            line_style, line_zorder = "--", 1
+
+        # artists for the new items of a frame, they are not part of the cached background.
+        self.new_demands = self.axes.scatter([], [], color="black", s=50, zorder=2, animated=True)
+        self.new_facilities = self.axes.scatter([], [], color="red", s=50, marker="*", zorder=2, animated=True)
+        self.new_lines = LineCollection([], colors="grey", linestyles=line_style, zorder=line_zorder, animated=True)
+        self.axes.add_collection(self.new_lines, autolim=False)
+        self.title = self.axes.set_title("", animated=True)
+
+        self.canvas.draw()
+        axes_box = self.axes.get_window_extent()
+        self.title_box = Bbox.from_extents(0, axes_box.y1, self.figure.bbox.width, self.figure.bbox.height)
+        self.title_background = self.canvas.copy_from_bbox(self.title_box)
+
+    # draws the demands and facilities added to the instance since the last call and returns the frame
+    # as an RGBA array. the array is the canvas buffer itself, it is only valid until the next Update.
+    @Metrics.Timed("draw_seconds", kind="Draw_Animation")
+    def Update(self, demands: list, facilities: list, costs: float = 0) -> np.ndarray:
+        new_demands = [demands[i] for i in range(self.demand_count, len(demands))]
+        new_facilities = [facilities[i] for i in range(self.facility_count, len(facilities))]
+        self.demand_count, self.facility_count = len(demands), len(facilities)
+
+        segments = [(demand.position[:2], demand.facility.position[:2]) for demand in new_demands if demand.facility is not None]
+        self.new_lines.set_segments(segments)
+        self.new_demands.set_offsets(As_Coordinates(new_demands)[:, :2] if len(new_demands) > 0 else np.zeros((0, 2)))
+        self.new_facilities.set_offsets(As_Coordinates(new_facilities)[:, :2] if len(new_facilities) > 0 else np.zeros((0, 2)))
+
+        title_str = f"Area:{self.area}\nDemand:{len(demands)} --- Facilities: {len(facilities)}"
+        if costs > 0:
+            title_str += f" --- Total Costs: {costs}"
+        self.title.set_text(title_str)
+
+        self.canvas.restore_region(self.title_background)
+        for artist in (self.new_lines, self.new_demands, self.new_facilities, self.title):
+            self.axes.draw_artist(artist)
+        return np.asarray(self.canvas.buffer_rgba())
+
+    def Close(self) -> None:
+        self.figure.clear()
+
+
+# writes every frame as {file_name}_{i}.png into Save_Path, counting from start. a low compression level keeps the
+# encoding from dominating the time per frame.
+def Write_PNG_Frames(frames, file_name: str, compress_level: int = 1, start: int = 0) -> None:
+    for i, frame in enumerate(frames, start=start):
+        Image.fromarray(frame[:, :, :3]).save(os.path.join(Save_Path, f"{file_name}_{i}.png"), compress_level=compress_level)
+
+# writes all frames into a single animated file in Save_Path. the frames are piped to ffmpeg one at a time,
+# gif with a palette per frame so nothing is buffered. without ffmpeg a gif is written with Pillow, which
+# collects every frame before encoding, so it is limited to max_frames frames.
+def Write_Animated_File(frames, file_name: str, format: str = "gif", fps: int = 10, max_frames: int = 500) -> None:
+    path = os.path.join(Save_Path, f"{file_name}.{format}")
+    frames = iter(frames)
+
+    if shutil.which("ffmpeg") is None:
+        if format != "gif":
+            raise Exception(f"\n\tffmpeg is required for the format '{format}'.")
+        images = []
+        for frame in frames:
+            if len(images) == max_frames:
+                raise Exception(f"\n\tWithout ffmpeg a gif is limited to {max_frames} frames, install ffmpeg to stream longer animations.")
+            images.append(Image.fromarray(frame[:, :, :3]))
+        images[0].save(path, save_all=True, append_images=images[1:], duration=int(1000 / fps), loop=0)
+        return
+
+    first = next(frames)
+    if format == "gif":
+        output = ["-vf", "split[a][b];[a]palettegen=stats_mode=single[p];[b][p]paletteuse=new=1"]
+    else:
+        output = ["-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{first.shape[1]}x{first.shape[0]}",
+               "-r", str(fps), "-i", "-"] + output + [path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        process.stdin.write(first.tobytes())
+        for frame in frames:
+            process.stdin.write(frame.tobytes())
+        process.stdin.close()
+    except BrokenPipeError:
+        # ffmpeg stopped reading, its exit code below tells why.
+        pass
+    if process.wait() != 0:
+        raise Exception(f"\n\tffmpeg failed with exit code {process.returncode} while writing '{path}'.")
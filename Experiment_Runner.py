@@ -0,0 +1,111 @@
+import os
+import random as rd
+import numpy as np
+from time import perf_counter
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from Facility_Class import Generate_Stream
+from Meyerson_Algorithm import Run_Algorithm, Calculate_Costs, Sample_Size
+
+""" Classes Results """
+
+# compact result of one algorithm on one trial, no Facility or Demand objects.
+class Trial_Result(NamedTuple):
+    trial: int
+    sample_size: int
+    option: str
+    facilities: int
+    cost: float
+    time_algorithm: float
+    time_costs: float
+
+
+""" Helper Functions """
+
+# derives an independent seed for every trial from a single root seed.
+def Trial_Seeds(seed: int, iterations: int) -> list[int]:
+    children = np.random.SeedSequence(seed).spawn(iterations)
+    return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in children]
+
+# runs all options on one generated test case. the random module is reseeded with the trial seed,
+# so the outcome does not depend on the process or the order the trials are run in. the state of the
+# caller is restored afterwards.
+def Run_Trial(trial: int, trial_seed: int, area: tuple, costs: int, options: tuple, q: float) -> list[Trial_Result]:
+    state = rd.getstate()
+    rd.seed(trial_seed)
+    try:
+        sample_size = Sample_Size(area, 0.05)
+        input_stream = Generate_Stream(sample_size, area)
+
+        results = []
+        for option in options:
+            start = perf_counter()
+            facilities = Run_Algorithm(option, area, input_stream, costs, q)
+            facilities_time = perf_counter()
+            total_costs = Calculate_Costs(facilities, costs)
+            results.append(Trial_Result(trial, sample_size, option, len(facilities), float(total_costs),
+                                        facilities_time - start, perf_counter() - facilities_time))
+        return results
+    finally:
+        rd.setstate(state)
+
+# Run_Trial with a single argument tuple, used by the process pool.
+def Run_Trial_Packed(arguments: tuple) -> list[Trial_Result]:
+    return Run_Trial(*arguments)
+
+
+""" Experiment Runner """
+
+# runs the trials of Test_Algorithm (one option) or Compare_Algorithms (several options) over a process pool.
+# returns one list of Trial_Result per trial, in trial order. the results besides the timings are
+# identical for every amount of workers.
+def Run_Experiment(iterations: int, area: tuple, costs: int, options: tuple = ("meyerson", "q_meyerson", "lloyd"),
+                   q: float = 0.5, seed: int = 0, workers: int = None) -> list[list[Trial_Result]]:
+    if isinstance(options, str):
+        options = (options,)
+    arguments = [(i, trial_seed, area, costs, tuple(options), q) for i, trial_seed in enumerate(Trial_Seeds(seed, iterations))]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return [Run_Trial_Packed(item) for item in arguments]
+
+    chunk_size = max(1, iterations // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(Run_Trial_Packed, arguments, chunksize=chunk_size))
+
+
+def Print_Experiment(results: list[list[Trial_Result]]) -> None:
+    for trial in results:
+        print(f"--> Demand: {trial[0].sample_size}")
+        for result in trial:
+            print(f"{result.option}: \t{result.facilities} Facilities \t{result.cost} Costs \t{np.around(result.time_algorithm, 5)} sec.")
+        print("")
+
+    total_time = sum(result.time_algorithm + result.time_costs for trial in results for result in trial)
+    total_demand = sum(trial[0].sample_size for trial in results)
+    print(f"Total time: {total_time} sec (summed over workers) for {total_demand} Demand points.")
+
+
+if __name__ == "__main__":
+    test_area = (50, 50)
+    test_facility_cost = 27
+    test_iterations = 40
+
+    # the results have to be the same for every amount of workers, the serial run keeps the caller's random state.
+    rd.seed(5)
+    test_state = rd.getstate()
+    start = perf_counter()
+    test_serial = Run_Experiment(test_iterations, test_area, test_facility_cost, seed=1, workers=1)
+    serial_time = perf_counter() - start
+    assert rd.getstate() == test_state
+
+    start = perf_counter()
+    test_parallel = Run_Experiment(test_iterations, test_area, test_facility_cost, seed=1, workers=4)
+    parallel_time = perf_counter() - start
+
+    strip = lambda results: [[result[:5] for result in trial] for trial in results]
+    assert strip(test_serial) == strip(test_parallel)
+
+    Print_Experiment(test_parallel)
+    print(f"1 worker: {np.around(serial_time, 3)} sec \t4 workers: {np.around(parallel_time, 3)} sec")
@@ -1,5 +1,6 @@
 import random as rd
 import numpy as np
+from array import array
 
 """ Classes Algorithm """
 
@@ -18,6 +19,95 @@ class Facility:
         self.service.append(demand)
         demand.facility = self
 
+# running totals of a result, recorded while the demands are assigned.
+# distances holds one entry per assigned demand (0 for a demand opening its own facility).
+# mutations counts the changes of the facility list the ledger accounts for, see Facility_List.
+class Cost_Ledger:
+    def __init__(self) -> None:
+        self.opened = 0
+        self.connection_cost = 0
+        self.distances = array("d")
+        self.mutations = 0
+
+    # a facility appended to the list.
+    def Open(self) -> None:
+        self.opened += 1
+        self.mutations += 1
+        self.distances.append(0)
+
+    # a facility removed from the list.
+    def Close(self) -> None:
+        self.opened -= 1
+        self.mutations += 1
+
+    def Connect(self, distance: float) -> None:
+        self.connection_cost += distance
+        self.distances.append(distance)
+
+    def Connect_Many(self, distances: np.ndarray) -> None:
+        self.connection_cost += float(np.sum(distances))
+        self.distances.extend(np.asarray(distances, dtype=np.float64))
+
+    # takes over the facilities of a list built without the ledger.
+    def Attach(self, facilities: "Facility_List") -> None:
+        self.opened = len(facilities)
+        self.mutations = facilities.mutations
+
+    # the distances of all connections in their order, 0 for the demands that opened a facility.
+    def Distances(self) -> np.ndarray:
+        return np.frombuffer(self.distances, dtype=np.float64)
+
+    # |F|*f + \sum d(F, u), see Calculate_Costs.
+    def Total(self, facility_cost: int) -> float:
+        return self.opened * facility_cost + self.connection_cost
+
+# list of facilities returned by the algorithms, carrying the ledger of the run. every change of the list
+# counts as a mutation, the ledger is only used by Calculate_Costs while it accounts for all of them.
+class Facility_List(list):
+    mutations = 0
+
+    def __init__(self, facilities: list = (), ledger: Cost_Ledger = None) -> None:
+        super().__init__(facilities)
+        self.ledger = ledger
+        self.mutations = len(self)
+
+    def append(self, facility) -> None:
+        super().append(facility)
+        self.mutations += 1
+
+    def extend(self, facilities: list) -> None:
+        size = len(self)
+        super().extend(facilities)
+        self.mutations += len(self) - size
+
+    def insert(self, index: int, facility) -> None:
+        super().insert(index, facility)
+        self.mutations += 1
+
+    def remove(self, facility) -> None:
+        super().remove(facility)
+        self.mutations += 1
+
+    def pop(self, index: int = -1):
+        self.mutations += 1
+        return super().pop(index)
+
+    def clear(self) -> None:
+        self.mutations += len(self)
+        super().clear()
+
+    def __setitem__(self, index, facility) -> None:
+        super().__setitem__(index, facility)
+        self.mutations += 1
+
+    def __delitem__(self, index) -> None:
+        super().__delitem__(index)
+        self.mutations += 1
+
+    def __iadd__(self, facilities: list) -> "Facility_List":
+        self.extend(facilities)
+        return self
+
 """ Functions """
 
 # create a random Demand within the defined realm. 
@@ -29,13 +119,21 @@ def Randomize_Demand(area: tuple) -> Demand:
 def Generate_Stream(set_size: int, area: tuple) -> list[Demand]:
     return [Randomize_Demand(area) for i in range(0, set_size)]
 
-def Randomize_Bias_Demand(area: tuple, bias: float) -> Demand:
-    center_area = tuple([np.around((area[i] / 2)) for i in range(0, len(area))])
-    pos_demand = [rd.randint(np.around(center_area[i] *(1-bias) ), np.around(center_area[i] * ( 1+bias))) for i in range(0, len(center_area))]
+# the bounds of the biased box are computed once per stream and passed in as bounds.
+def Randomize_Bias_Demand(area: tuple, bias: float, bounds: list[tuple] = None) -> Demand:
+    if bounds is None:
+        bounds = Bias_Bounds(area, bias)
+    pos_demand = [rd.randint(lower, upper) for lower, upper in bounds]
     return Demand(tuple(pos_demand))
 
+# integer bounds of the box around the center of the area, one (lower, upper) pair per dimension.
+def Bias_Bounds(area: tuple, bias: float) -> list[tuple]:
+    center_area = tuple([np.around((area[i] / 2)) for i in range(0, len(area))])
+    return [(int(np.around(center * (1-bias))), int(np.around(center * (1+bias)))) for center in center_area]
+
 def Generate_Bias_Stream(set_size: int, area: tuple, bias: float = 0.5) -> list[Demand]:
-    return [Randomize_Bias_Demand(area, bias) for i in range(0, set_size)]
+    bounds = Bias_Bounds(area, bias)
+    return [Randomize_Bias_Demand(area, bias, bounds) for i in range(0, set_size)]
 
 
 if __name__ == "__main__":
@@ -48,3 +146,10 @@ if __name__ == "__main__":
     test_facility = Facility((2,3), test_demand)
     for demand in test_stream:
         test_facility.Add_Service(demand)
+
+    # a remove and an append keep the length, the ledger has to notice the change anyway.
+    test_list = Facility_List([test_facility], Cost_Ledger())
+    test_list.ledger.Attach(test_list)
+    test_list.remove(test_facility)
+    test_list.append(Facility((5,5), test_demand))
+    assert len(test_list) == test_list.ledger.opened and test_list.mutations != test_list.ledger.mutations
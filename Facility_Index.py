@@ -0,0 +1,327 @@
+import math
+from bisect import bisect
+import numpy as np
+import Metrics
+from itertools import product
+from Facility_Class import Facility, Facility_List
+from Distance_Kernel import As_Coordinates, Point_Distances, Squared_Norms
+
+""" Helper Functions """
+
+# returns the grid cell containing a position.
+def Get_Cell(position: tuple, cell_size: float) -> tuple:
+    return tuple(math.floor(x / cell_size) for x in position)
+
+# chebyshev distance between two cells, i.e. the ring a cell lies on.
+def Cell_Ring(cell: tuple, home: tuple) -> int:
+    return max(abs(c - h) for c, h in zip(cell, home))
+
+# amount of cells in the ring r around a cell in the given dimension.
+def Ring_Size(r: int, dimension: int) -> int:
+    if r == 0:
+        return 1
+    return (2*r + 1)**dimension - (2*r - 1)**dimension
+
+# all cells on the ring r around the home cell.
+def Ring_Cells(home: tuple, r: int) -> list[tuple]:
+    if r == 0:
+        return [home]
+    offsets = product(range(-r, r + 1), repeat=len(home))
+    return [tuple(h + o for h, o in zip(home, offset)) for offset in offsets if max(abs(o) for o in offset) == r]
+
+
+""" Classes Index """
+
+# facilities of a single grid cell, with their coordinates cached as an array.
+class Grid_Cell:
+    __slots__ = ("orders", "facilities", "coordinates")
+
+    def __init__(self) -> None:
+        self.orders = []
+        self.facilities = []
+        self.coordinates = None
+
+    # the facilities are kept sorted by their order.
+    def Add(self, order: int, facility: Facility) -> None:
+        index = bisect(self.orders, order)
+        self.orders.insert(index, order)
+        self.facilities.insert(index, facility)
+        self.coordinates = None
+
+    # removes the facility and returns its order.
+    def Remove(self, facility: Facility) -> int:
+        index = next(i for i, item in enumerate(self.facilities) if item is facility)
+        self.facilities.pop(index)
+        self.coordinates = None
+        return self.orders.pop(index)
+
+    def Get_Coordinates(self) -> np.ndarray:
+        if self.coordinates is None:
+            self.coordinates = As_Coordinates(self.facilities)
+        return self.coordinates
+
+
+# uniform grid over the open facilities. behaves like the plain facility list (insertion order is kept),
+# but answers nearest facility queries by only looking at the cells around the demand.
+# with epsilon > 0 the queries are approximate: the returned facility is at most (1 + epsilon) times
+# farther away than the nearest one, in exchange the search stops after fewer rings.
+class Facility_Grid(Facility_List):
+    def __init__(self, cell_size: float = 1, facilities: list = (), epsilon: float = 0) -> None:
+        super().__init__()
+        self.cell_size = cell_size if cell_size > 0 else 1
+        self.epsilon = epsilon
+        self.cells = {}
+        self.order = 0
+        self.lower = None
+        self.upper = None
+        self.extend(facilities)
+
+    def __reduce__(self) -> tuple:
+        return (self.__class__, (self.cell_size, list(self), self.epsilon), {"ledger": self.ledger, "mutations": self.mutations})
+
+    def Insert(self, facility: Facility) -> None:
+        cell = Get_Cell(facility.position, self.cell_size)
+        if cell not in self.cells:
+            self.cells[cell] = Grid_Cell()
+        self.cells[cell].Add(self.order, facility)
+        self.order += 1
+
+        # bounding box of all occupied cells, used to stop the ring search.
+        if self.lower is None:
+            self.lower, self.upper = list(cell), list(cell)
+        else:
+            self.lower = [min(l, c) for l, c in zip(self.lower, cell)]
+            self.upper = [max(u, c) for u, c in zip(self.upper, cell)]
+
+    def append(self, facility: Facility) -> None:
+        super().append(facility)
+        self.Insert(facility)
+
+    # the later facilities move up by one, so the orders stay the indices in the list.
+    def remove(self, facility: Facility) -> None:
+        order = self.Detach(facility)
+        del self[order]
+        for grid_cell in self.cells.values():
+            start = bisect(grid_cell.orders, order)
+            grid_cell.orders[start:] = [item - 1 for item in grid_cell.orders[start:]]
+        self.order -= 1
+
+    # takes the facility out of its cell, returns its order.
+    def Detach(self, facility: Facility) -> int:
+        cell = Get_Cell(facility.position, self.cell_size)
+        order = self.cells[cell].Remove(facility)
+        if len(self.cells[cell].facilities) == 0:
+            del self.cells[cell]
+        return order
+
+    # moves an open facility to a new position, it keeps its place in the list.
+    def Move(self, facility: Facility, position: tuple) -> None:
+        order = self.Detach(facility)
+        facility.position = position
+        cell = Get_Cell(position, self.cell_size)
+        if cell not in self.cells:
+            self.cells[cell] = Grid_Cell()
+        self.cells[cell].Add(order, facility)
+        self.lower = [min(l, c) for l, c in zip(self.lower, cell)]
+        self.upper = [max(u, c) for u, c in zip(self.upper, cell)]
+
+    # all facilities in the cells up to rings cells away from the position.
+    def Neighbours(self, position: tuple, rings: int = 1) -> list[Facility]:
+        home = Get_Cell(position, self.cell_size)
+        cells = [cell for r in range(0, rings + 1) for cell in Ring_Cells(home, r) if cell in self.cells]
+        return [facility for cell in cells for facility in self.cells[cell].facilities]
+
+    def extend(self, facilities: list) -> None:
+        for facility in facilities:
+            self.append(facility)
+
+    # like extend, with the (n, d) coordinate array of the facilities given. the cells are computed and
+    # grouped in one vectorized pass instead of one Insert per facility, e.g. to rebuild a grid from a store.
+    def Extend_Coordinates(self, facilities: list, coordinates: np.ndarray) -> None:
+        if len(facilities) == 0:
+            return
+        coordinates = np.asarray(coordinates, dtype=np.float64)
+        cells = np.floor(coordinates / self.cell_size).astype(np.int64)
+        # lexsort is stable, so the facilities of a cell stay in their order.
+        members = np.lexsort(cells.T[::-1])
+        cells = cells[members]
+        starts = np.flatnonzero(np.concatenate([[True], np.any(cells[1:] != cells[:-1], axis=1)]))
+        occupied, bounds = cells[starts], np.append(starts[1:], len(cells))
+
+        super().extend(facilities)
+        start = 0
+        for cell, end in zip(map(tuple, occupied.tolist()), bounds.tolist()):
+            indices = members[start:end]
+            start = end
+            if cell in self.cells:
+                for index in indices.tolist():
+                    self.cells[cell].Add(self.order + index, facilities[index])
+                continue
+            grid_cell = Grid_Cell()
+            grid_cell.orders = (self.order + indices).tolist()
+            grid_cell.facilities = [facilities[index] for index in indices.tolist()]
+            grid_cell.coordinates = coordinates[indices]
+            self.cells[cell] = grid_cell
+        self.order += len(facilities)
+
+        lower, upper = np.min(occupied, axis=0).tolist(), np.max(occupied, axis=0).tolist()
+        if self.lower is None:
+            self.lower, self.upper = lower, upper
+        else:
+            self.lower = [min(l, c) for l, c in zip(self.lower, lower)]
+            self.upper = [max(u, c) for u, c in zip(self.upper, upper)]
+
+    # largest ring around the home cell that still contains occupied cells.
+    def Max_Ring(self, home: tuple) -> int:
+        return max(max(h - l, u - h) for h, l, u in zip(home, self.lower, self.upper))
+
+    # returns the distance and the facility closest to the position. ties are broken by insertion order,
+    # which gives exactly the same result as the brute-force search over the list. epsilon overrides
+    # the error factor of the grid for this query.
+    def Nearest(self, position: tuple, epsilon: float = None) -> tuple:
+        norm, order, facility = self.Search(position, epsilon)
+        return (norm, facility)
+
+    # like Nearest, but also returns the order of the facility, its index in the list.
+    def Search(self, position: tuple, epsilon: float = None) -> tuple:
+        if len(self) == 0:
+            return (10000, -1, None)
+
+        home = Get_Cell(position, self.cell_size)
+        max_ring = self.Max_Ring(home)
+        factor = 1 + (self.epsilon if epsilon is None else epsilon)
+        # distance of the position to the border of its home cell.
+        margin = min(min(x - h*self.cell_size, (h + 1)*self.cell_size - x) for x, h in zip(position, home))
+        best = None
+
+        for r in range(0, max_ring + 1):
+            if Ring_Size(r, len(home)) > len(self.cells):
+                # the ring is larger than the grid itself, check the remaining occupied cells directly.
+                members = [grid_cell for cell, grid_cell in self.cells.items() if Cell_Ring(cell, home) >= r]
+                best = self.Closest(position, members, best)
+                break
+
+            members = [self.cells[cell] for cell in Ring_Cells(home, r) if cell in self.cells]
+            best = self.Closest(position, members, best)
+
+            # everything outside of ring r is at least r cells plus the margin away. the tolerance covers the rounding.
+            if best is not None and factor * (r*self.cell_size + margin - 0.0001) > best[0]:
+                break
+
+        return best
+
+    # exact Search for many positions at once, returns the distances and orders (10000 and -1 without any
+    # facility). the home cell and its first ring are searched for all positions together, one vectorized
+    # step per neighbour cell and facility slot. only the positions whose nearest facility could still lie
+    # farther out, and all positions with epsilon > 0 or more than 3 dimensions, go through Search.
+    def Search_Many(self, positions: np.ndarray) -> tuple:
+        positions = np.asarray(positions, dtype=np.float64)
+        norms = np.full(len(positions), 10000, dtype=np.float64)
+        orders = np.full(len(positions), -1, dtype=np.int64)
+        if len(self) == 0 or len(positions) == 0:
+            return (norms, orders)
+        if self.epsilon > 0 or positions.shape[1] > 3:
+            for i, position in enumerate(positions.tolist()):
+                norms[i], orders[i], _ = self.Search(tuple(position))
+            return (norms, orders)
+
+        # the occupied cells as sorted integer keys, the facilities of a cell lie in one contiguous range.
+        grid_cells = list(self.cells.values())
+        cells = np.array(list(self.cells.keys()), dtype=np.int64).reshape(len(grid_cells), -1)
+        counts = np.array([len(grid_cell.orders) for grid_cell in grid_cells], dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        coordinates = np.concatenate([grid_cell.Get_Coordinates() for grid_cell in grid_cells])
+        facility_orders = np.array([order for grid_cell in grid_cells for order in grid_cell.orders], dtype=np.int64)
+
+        homes = np.floor(positions / self.cell_size).astype(np.int64)
+        lower = np.minimum(cells.min(axis=0), homes.min(axis=0)) - 1
+        shape = np.maximum(cells.max(axis=0), homes.max(axis=0)) + 2 - lower
+        if np.prod(shape.astype(np.float64)) >= 2**62:
+            for i, position in enumerate(positions.tolist()):
+                norms[i], orders[i], _ = self.Search(tuple(position))
+            return (norms, orders)
+        keys = np.ravel_multi_index((cells - lower).T, shape)
+        sort = np.argsort(keys)
+        keys = keys[sort]
+
+        norms[:] = np.inf
+        evaluations = 0
+        for offset in product((-1, 0, 1), repeat=positions.shape[1]):
+            neighbour = np.ravel_multi_index((homes + np.array(offset) - lower).T, shape)
+            index = np.minimum(np.searchsorted(keys, neighbour), len(keys) - 1)
+            cell = sort[index]
+            size = np.where(keys[index] == neighbour, counts[cell], 0)
+            for slot in range(0, int(np.max(size))):
+                members = np.flatnonzero(size > slot)
+                facility = starts[cell[members]] + slot
+                evaluations += len(members)
+                difference = coordinates[facility] - positions[members]
+                norm = np.around(np.sqrt(Squared_Norms(difference)), decimals=4)
+                order = facility_orders[facility]
+                closer = (norm < norms[members]) | ((norm == norms[members]) & (order < orders[members]))
+                norms[members[closer]], orders[members[closer]] = norm[closer], order[closer]
+
+        # like the stopping rule of Search after the first ring, everything farther out is at least one cell
+        # plus the margin away. if the first ring already covers all occupied cells the result is exact anyway.
+        margin = np.min(np.minimum(positions - homes * self.cell_size, (homes + 1) * self.cell_size - positions), axis=1)
+        covered = np.all((homes - 1 <= cells.min(axis=0)) & (homes + 1 >= cells.max(axis=0)), axis=1)
+        for i in np.flatnonzero(~covered & ~(self.cell_size + margin - 0.0001 > norms)).tolist():
+            norms[i], orders[i], _ = self.Search(tuple(positions[i].tolist()))
+        if Metrics.Enabled:
+            Metrics.Increment("distance_evaluations", evaluations)
+        return (norms, orders)
+
+    # compares the facilities of the cells to the current best candidate (norm, order, facility).
+    # the distances to all facilities of the cells are computed in a single kernel call.
+    def Closest(self, position: tuple, grid_cells: list, best: tuple = None) -> tuple:
+        if len(grid_cells) == 0:
+            return best
+        if len(grid_cells) == 1:
+            norm = Point_Distances(position, grid_cells[0].Get_Coordinates(), 4)
+            # orders within a cell are increasing, so argmin already takes the earliest facility.
+            index = np.argmin(norm)
+            candidate = (norm[index], grid_cells[0].orders[index], grid_cells[0].facilities[index])
+        else:
+            norm = Point_Distances(position, np.concatenate([grid_cell.Get_Coordinates() for grid_cell in grid_cells]), 4)
+            bounds = np.cumsum([len(grid_cell.orders) for grid_cell in grid_cells])
+            # among equally close facilities the earliest one wins.
+            ties = np.flatnonzero(norm == np.min(norm))
+            cells = np.searchsorted(bounds, ties, side="right")
+            offsets = ties - np.concatenate([[0], bounds])[cells]
+            order, cell, offset = min((grid_cells[c].orders[o], c, o) for c, o in zip(cells.tolist(), offsets.tolist()))
+            candidate = (norm[ties[0]], order, grid_cells[cell].facilities[offset])
+
+        if best is None or candidate[:2] < best[:2]:
+            best = candidate
+        return best
+
+if __name__ == "__main__":
+    import random as rd
+    from Facility_Class import Generate_Stream
+    from Meyerson_Algorithm import Euclidean_Norm
+
+    # compare the grid with the brute-force search.
+    test_stream = Generate_Stream(500, (50, 50))
+    test_facilities = [Facility(demand.position, demand) for demand in rd.sample(test_stream, 40)]
+    test_grid = Facility_Grid(7, test_facilities)
+
+    for demand in test_stream:
+        norm = [Euclidean_Norm(demand.position, facility.position) for facility in test_facilities]
+        assert test_grid.Nearest(demand.position) == (np.min(norm), test_facilities[np.argmin(norm)])
+
+    # approximate queries stay within the error factor.
+    test_grid.epsilon = 0.5
+    for demand in test_stream:
+        norm = [Euclidean_Norm(demand.position, facility.position) for facility in test_facilities]
+        assert test_grid.Nearest(demand.position)[0] <= 1.5 * np.min(norm) + 0.0001
+
+    # the vectorized extend has to build the same grid, also on top of existing facilities.
+    test_bulk = Facility_Grid(7, test_facilities[:10])
+    test_bulk.Extend_Coordinates(test_facilities[10:], As_Coordinates(test_facilities[10:]))
+    test_grid.epsilon = 0
+    assert list(test_bulk) == list(test_grid) and test_bulk.order == test_grid.order
+    assert (test_bulk.lower, test_bulk.upper) == (test_grid.lower, test_grid.upper)
+    for cell, grid_cell in test_grid.cells.items():
+        assert test_bulk.cells[cell].orders == grid_cell.orders and test_bulk.cells[cell].facilities == grid_cell.facilities
+    for demand in test_stream:
+        assert test_bulk.Search(demand.position) == test_grid.Search(demand.position)
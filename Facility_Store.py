@@ -0,0 +1,228 @@
+import numpy as np
+from Facility_Class import Facility, Demand
+
+""" Helper Functions """
+
+# returns an array with at least the required amount of rows, doubling the capacity if needed.
+def Grow_Array(array: np.ndarray, required: int, fill=0) -> np.ndarray:
+    if required <= len(array):
+        return array
+    capacity = max(required, 2*len(array), 16)
+    grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+""" Classes Views """
+
+# lightweight stand-in for Demand, the data lives in the store.
+class Demand_View:
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "Demand_Store", index: int) -> None:
+        self.store = store
+        self.index = index
+
+    @property
+    def position(self) -> tuple:
+        return tuple(self.store.coordinates[self.index].tolist())
+
+    # only facilities of the same store are recorded, others (e.g. from Lloyd_Clustering) are ignored.
+    @property
+    def facility(self) -> "Facility_View":
+        facility_index = self.store.assignment[self.index]
+        if facility_index < 0:
+            return None
+        return Facility_View(self.store, int(facility_index))
+
+    @facility.setter
+    def facility(self, facility) -> None:
+        if facility is None:
+            self.store.Assign(self.index, -1)
+        elif isinstance(facility, Facility_View) and facility.store is self.store:
+            self.store.Assign(self.index, facility.index)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Demand_View) and other.store is self.store and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.store), self.index))
+
+
+# lightweight stand-in for Facility, the service list is derived from the assignment array.
+class Facility_View:
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "Demand_Store", index: int) -> None:
+        self.store = store
+        self.index = index
+
+    @property
+    def position(self) -> tuple:
+        return tuple(self.store.facility_coordinates[self.index].tolist())
+
+    @property
+    def service(self) -> "View_List":
+        return View_List(self.store, Demand_View, self.store.Service_Indices(self.index))
+
+    def Add_Service(self, demand: Demand_View) -> None:
+        demand.facility = self
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Facility_View) and other.store is self.store and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.store), -1 - self.index))
+
+
+# read-only sequence of views. without indices it always covers the whole (growing) table.
+class View_List:
+    __slots__ = ("store", "view", "indices")
+
+    def __init__(self, store: "Demand_Store", view: type, indices: np.ndarray = None) -> None:
+        self.store = store
+        self.view = view
+        self.indices = indices
+
+    def __len__(self) -> int:
+        if self.indices is not None:
+            return len(self.indices)
+        return self.store.size if self.view is Demand_View else self.store.facility_size
+
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("View_List index out of range")
+        return self.view(self.store, int(i) if self.indices is None else int(self.indices[i]))
+
+    def __iter__(self):
+        for i in range(0, len(self)):
+            yield self[i]
+
+    # the coordinates of all items as an (n, d) array, without building any view.
+    @property
+    def coordinates(self) -> np.ndarray:
+        if self.view is Demand_View:
+            table = self.store.coordinates[:self.store.size]
+        else:
+            table = self.store.facility_coordinates[:self.store.facility_size]
+        return table if self.indices is None else table[self.indices]
+
+
+""" Classes Store """
+
+# columnar storage for demands and facilities: an (n, d) coordinate array, an int32 facility
+# assignment per demand (-1 for unassigned) and a table with the facility coordinates.
+class Demand_Store:
+    def __init__(self, dimension: int = 2, capacity: int = 1024) -> None:
+        self.dimension = dimension
+        self.size = 0
+        self.facility_size = 0
+        self.coordinates = np.empty((capacity, dimension), dtype=np.float64)
+        self.assignment = np.full(capacity, -1, dtype=np.int32)
+        self.facility_coordinates = np.empty((16, dimension), dtype=np.float64)
+        self.groups = None
+
+    def Add_Demand(self, position: tuple) -> Demand_View:
+        self.coordinates = Grow_Array(self.coordinates, self.size + 1)
+        self.assignment = Grow_Array(self.assignment, self.size + 1, -1)
+        self.coordinates[self.size] = position
+        self.size += 1
+        self.groups = None
+        return Demand_View(self, self.size - 1)
+
+    # appends a block of coordinates at once and returns the views of the new demands.
+    def Add_Demands(self, coordinates: np.ndarray) -> View_List:
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, self.dimension)
+        start, self.size = self.size, self.size + len(coordinates)
+        self.coordinates = Grow_Array(self.coordinates, self.size)
+        self.assignment = Grow_Array(self.assignment, self.size, -1)
+        self.coordinates[start:self.size] = coordinates
+        self.groups = None
+        return View_List(self, Demand_View, np.arange(start, self.size))
+
+    # opens a facility at the position, optionally serving a first demand like Facility does.
+    def Open_Facility(self, position: tuple, demand: Demand_View = None) -> Facility_View:
+        self.facility_coordinates = Grow_Array(self.facility_coordinates, self.facility_size + 1)
+        self.facility_coordinates[self.facility_size] = position
+        self.facility_size += 1
+        facility = Facility_View(self, self.facility_size - 1)
+        if demand is not None:
+            facility.Add_Service(demand)
+        return facility
+
+    def Assign(self, demand_index: int, facility_index: int) -> None:
+        self.assignment[demand_index] = facility_index
+        self.groups = None
+
+    # demand indices served by a facility. the grouping of all demands is cached until the next change.
+    def Service_Indices(self, facility_index: int) -> np.ndarray:
+        if self.groups is None:
+            assignment = self.assignment[:self.size]
+            order = np.argsort(assignment, kind="stable")
+            offsets = np.searchsorted(assignment[order], np.arange(0, self.facility_size + 1))
+            self.groups = (order, offsets)
+        order, offsets = self.groups
+        return order[offsets[facility_index]:offsets[facility_index + 1]]
+
+    def Demands(self) -> View_List:
+        return View_List(self, Demand_View)
+
+    def Facilities(self) -> View_List:
+        return View_List(self, Facility_View)
+
+
+""" Functions """
+
+# builds a store from existing Demand and Facility objects or from views of another store. the facilities
+# are matched by equality, not by id(), since a Facility_View is a new object on every access.
+def Build_Store(demands: list, facilities: list) -> Demand_Store:
+    store = Demand_Store(len(demands[0].position) if len(demands) > 0 else 2, max(len(demands), 1))
+    store.Add_Demands([demand.position for demand in demands])
+    for facility in facilities:
+        store.Open_Facility(facility.position)
+
+    facility_index = {facility: i for i, facility in enumerate(facilities)}
+    store.assignment[:store.size] = [facility_index.get(demand.facility, -1) for demand in demands]
+    return store
+
+
+if __name__ == "__main__":
+    import tracemalloc
+    from Facility_Class import Generate_Stream
+
+    # memory benchmark: Demand/Facility objects against the columnar store.
+    test_size = 200000
+    test_stream = Generate_Stream(test_size, (1000, 1000))
+    test_positions = [demand.position for demand in test_stream]
+    del test_stream
+
+    tracemalloc.start()
+    test_demands = [Demand(position) for position in test_positions]
+    test_facilities = [Facility(demand.position, demand) for demand in test_demands[:1000]]
+    for i, demand in enumerate(test_demands[1000:]):
+        test_facilities[i % 1000].Add_Service(demand)
+    objects_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del test_demands, test_facilities
+
+    tracemalloc.start()
+    test_store = Demand_Store(2, test_size)
+    test_store.Add_Demands(test_positions)
+    for i in range(0, 1000):
+        test_store.Open_Facility(test_positions[i])
+    test_store.assignment[:test_size] = np.arange(0, test_size) % 1000
+    store_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{test_size} Demands, 1000 Facilities")
+    print(f"objects: \t{np.around(objects_memory / 2**20, 2)} MiB")
+    print(f"store: \t\t{np.around(store_memory / 2**20, 2)} MiB")
+
+    # views of a store have to keep their assignment when they are copied into a new store.
+    from Meyerson_Class import Meyerson
+    test_meyerson = Meyerson((1000, 1000), 25, 1, Demand_Store(2))
+    test_meyerson.Add_Many(np.array(test_positions[:5000], dtype=np.float64))
+    test_copy = Build_Store(list(test_meyerson.demands), test_meyerson.facilities)
+    assert np.array_equal(test_copy.assignment[:test_copy.size], test_meyerson.store.assignment[:test_meyerson.store.size])
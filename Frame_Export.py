@@ -0,0 +1,107 @@
+import os
+import numpy as np
+import matplotlib
+from concurrent.futures import ProcessPoolExecutor
+import Draw_Classes
+from Draw_Classes import Draw_Comparison, Draw_Animation, Extract_Demands, Write_PNG_Frames
+from Facility_Store import Demand_Store, Demand_View, Facility_View, View_List, Build_Store
+from Distance_Kernel import As_Coordinates
+
+""" Helper Functions """
+
+# state of the worker process, set once by Initialize_Worker.
+Worker_State = {}
+
+# every worker renders with the Agg backend into the same Save_Path as the parent.
+def Initialize_Worker(save_path: str, state: dict = None) -> None:
+    matplotlib.use("Agg")
+    Draw_Classes.Save_Path = save_path
+    Worker_State.clear()
+    Worker_State.update(state or {})
+
+# copy of a store without the unused capacity, so only the filled rows are sent to the workers.
+def Compact_Store(store: Demand_Store) -> Demand_Store:
+    compact = Demand_Store(store.dimension, 0)
+    compact.coordinates = store.coordinates[:store.size].copy()
+    compact.assignment = store.assignment[:store.size].copy()
+    compact.facility_coordinates = store.facility_coordinates[:store.facility_size].copy()
+    compact.size, compact.facility_size = store.size, store.facility_size
+    return compact
+
+# splits range(0, size) into at most parts contiguous (start, stop) chunks.
+def Split_Range(size: int, parts: int) -> list[tuple]:
+    bounds = np.linspace(0, size, max(1, min(parts, size)) + 1).astype(int)
+    return [(bounds[i], bounds[i + 1]) for i in range(0, len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+def Get_Workers(workers: int = None) -> int:
+    return max(1, workers if workers is not None else (os.cpu_count() or 1))
+
+
+""" Comparison Export """
+
+# minimal state of one algorithm result [facilities, cost]: a compact store and the cost.
+def Snapshot_Result(result: list) -> tuple:
+    return (Compact_Store(Build_Store(Extract_Demands(result), result[0])), result[1])
+
+def Render_Comparison(task: tuple) -> str:
+    area, costs, sample_size, snapshots, file_name, dpi = task
+    results = [[store.Facilities(), cost] for store, cost in snapshots]
+    Draw_Comparison(area, costs, sample_size, *results).Save(file_name, dpi)
+    return file_name
+
+# saves the comparison images of Compare_Algorithms with a process pool. the file names are the same as
+# in Plot_Comparison (Comparison_Alg_{i}).
+def Export_Comparisons(area: tuple, costs: int, results: list, dpi: int = 300, workers: int = None) -> list[str]:
+    tasks = [(area, costs, result[0], [Snapshot_Result(item) for item in result[1:4]], f"Comparison_Alg_{i}", dpi)
+             for i, result in enumerate(results)]
+
+    with ProcessPoolExecutor(max_workers=Get_Workers(workers), initializer=Initialize_Worker, initargs=(Draw_Classes.Save_Path,)) as executor:
+        return list(executor.map(Render_Comparison, tasks))
+
+
+""" Slide Export """
+
+# renders the frames start..stop-1 of a slide show. the first frame draws the whole prefix at once,
+# every further frame only adds the new demand on the same figure.
+def Render_Slides(chunk: tuple) -> int:
+    start, stop = chunk
+    store, openers, frame_costs = Worker_State["store"], Worker_State["openers"], Worker_State["costs"]
+    animation = Draw_Animation(Worker_State["area"], Worker_State["img"], Worker_State["dpi"])
+
+    def Frames():
+        for i in range(start, stop):
+            demands = View_List(store, Demand_View, np.arange(0, i + 1))
+            facilities = View_List(store, Facility_View, np.arange(0, np.searchsorted(openers, i, side="right")))
+            yield animation.Update(demands, facilities, frame_costs[i])
+
+    # the frames are numbered from the first demand of the slide show.
+    Write_PNG_Frames(Frames(), Worker_State["file_name"], start=start - Worker_State["first_frame"])
+    animation.Close()
+    return stop - start
+
+# parallel version of Create_Basic_Slides / Create_BG_Slides. the demands are added with Add_Many (same
+# decisions as Add_Demand), then the frames are rendered by the workers from a snapshot of the arrays.
+# the files are named like the sequential slides, {file_name}_{i}.png for the i-th demand of demand_list.
+def Export_Slides(meyerson, demand_list: list, file_name: str = "test_slide_show", img: str = None, dpi: int = 300,
+                  workers: int = None) -> None:
+    start_demands, start_cost = len(meyerson.demands), meyerson.total_cost
+    _, costs = meyerson.Add_Many(As_Coordinates(demand_list))
+
+    store = Compact_Store(meyerson.store if meyerson.store is not None else Build_Store(meyerson.demands, meyerson.facilities))
+    # index of the demand that opened each facility, in the order of the facility list.
+    openers = np.full(store.facility_size, store.size, dtype=np.int64)
+    np.minimum.at(openers, store.assignment[store.assignment >= 0], np.nonzero(store.assignment >= 0)[0])
+
+    # total cost after every demand, rounded after every step like Add_Demand does.
+    frames = np.arange(start_demands, store.size)
+    frame_costs = np.full(store.size, start_cost, dtype=np.float64)
+    for i, cost in zip(frames, costs):
+        start_cost = frame_costs[i] = np.around(start_cost + cost, decimals=3)
+
+    state = {"store": store, "openers": np.sort(openers), "costs": frame_costs, "area": meyerson.area, "img": img,
+             "dpi": dpi, "file_name": file_name, "first_frame": start_demands}
+    chunks = Split_Range(len(frames), 2 * Get_Workers(workers))
+    chunks = [(start_demands + start, start_demands + stop) for start, stop in chunks]
+
+    with ProcessPoolExecutor(max_workers=Get_Workers(workers), initializer=Initialize_Worker, initargs=(Draw_Classes.Save_Path, state)) as executor:
+        list(executor.map(Render_Slides, chunks))
@@ -0,0 +1,132 @@
+import numpy as np
+from typing import Callable, Iterable, Iterator
+from Facility_Class import Facility
+from Distance_Kernel import As_Coordinates, Paired_Distances
+from Lloyd_Vectorized import Get_Generator, Seed_Kmeans_PP, Assign_Centers, Build_Facilities
+from Demand_IO import Iterate_Npy_Batches
+
+""" Batch Sources """
+
+# groups a stream of Demands (or coordinate tuples) into coordinate blocks of batch_size rows.
+def Iterate_Batches(demands: Iterable, batch_size: int = 4096) -> Iterator[np.ndarray]:
+    batch = []
+    for demand in demands:
+        batch.append(demand)
+        if len(batch) == batch_size:
+            yield As_Coordinates(batch)
+            batch = []
+    if len(batch) > 0:
+        yield As_Coordinates(batch)
+
+# one pass over a batch source. the source has to be a callable returning a new iterator of blocks for every
+# pass, e.g. lambda: Iterate_Npy_Batches(path). a generator passed directly would be exhausted after the
+# first pass, so a pass without any block is an error.
+def Iterate_Pass(batch_source: Callable[[], Iterable[np.ndarray]]) -> Iterator[np.ndarray]:
+    if not callable(batch_source):
+        raise Exception("\n\tThe batch source has to be a callable returning a new iterator of blocks for every pass.")
+    empty = True
+    for batch in batch_source():
+        empty = False
+        yield batch
+    if empty:
+        raise Exception("\n\tA pass over the batch source did not yield any block, it has to return a new iterator for every pass.")
+
+
+""" Mini-Batch Lloyd """
+
+# moves every center to the running mean of all points assigned to it so far. the learning rate
+# of a center is 1/count, so centers with a long history move less.
+def Update_Centers_Mini_Batch(batch: np.ndarray, labels: np.ndarray, centers: np.ndarray, counts: np.ndarray) -> None:
+    batch_counts = np.bincount(labels, minlength=len(centers))
+    batch_sums = np.stack([np.bincount(labels, weights=batch[:, j], minlength=len(centers)) for j in range(0, batch.shape[1])], axis=1)
+
+    filled = batch_counts > 0
+    counts[filled] += batch_counts[filled]
+    centers[filled] += (batch_sums[filled] - batch_counts[filled, None] * centers[filled]) / counts[filled, None]
+
+# mini-batch k-means over a batch source. batch_source returns a new iterator of coordinate blocks
+# for every pass, so only one block is in memory at a time. returns the centers and their counts.
+def Mini_Batch_Lloyd(batch_source: Callable[[], Iterable[np.ndarray]], n_centers: int, passes: int = 1, seed: int = None) -> tuple:
+    rng = Get_Generator(seed)
+    centers, counts = None, None
+
+    for i in range(0, passes):
+        for batch in Iterate_Pass(batch_source):
+            if centers is None:
+                # seeding with k-means++ on the first block.
+                centers = Seed_Kmeans_PP(batch, n_centers, rng)
+                counts = np.zeros(n_centers, dtype=np.int64)
+            labels = Assign_Centers(batch, centers)
+            Update_Centers_Mini_Batch(batch, labels, centers, counts)
+
+    return (centers, counts)
+
+# final assignment pass. yields the labels (int32) and the distances to the centers for every block.
+def Assign_Batches(batch_source: Callable[[], Iterable[np.ndarray]], centers: np.ndarray) -> Iterator[tuple]:
+    for batch in Iterate_Pass(batch_source):
+        labels = Assign_Centers(batch, centers)
+        yield (labels.astype(np.int32), Paired_Distances(batch, centers[labels], 4))
+
+# compact result of a streaming run: centers, one int32 label per demand and the total cost.
+# the label array is the only part growing with the stream (4 bytes per demand). the batch source
+# is read passes + 1 times, so it has to return a new iterator on every call (see Iterate_Pass).
+def Mini_Batch_Assignment(batch_source: Callable[[], Iterable[np.ndarray]], n_centers: int, facility_cost: int = 1,
+                          passes: int = 1, seed: int = None) -> tuple:
+    centers, _ = Mini_Batch_Lloyd(batch_source, n_centers, passes, seed)
+
+    labels, distance_cost = [], 0
+    for batch_labels, distances in Assign_Batches(batch_source, centers):
+        labels.append(batch_labels)
+        distance_cost += np.sum(distances)
+
+    labels = np.concatenate(labels)
+    used = np.unique(labels)
+    total_cost = np.around(len(used) * facility_cost + distance_cost, decimals=2)
+    return (centers, labels, total_cost)
+
+
+""" Clustering """
+
+# mini-batch version of Lloyd_Clustering for a list of Demands, returns the facilities like Lloyd_Clustering.
+def Mini_Batch_Clustering(area: tuple, demand_list: list, batch_size: int = 1024, passes: int = 3,
+                          n_centers: int = None, seed: int = None) -> list[Facility]:
+    if len(demand_list) == 0:
+        return []
+    if n_centers is None:
+        n_centers = max(int(np.sqrt(len(demand_list))), 1)
+
+    coordinates = As_Coordinates(demand_list)
+    batch_source = lambda: (coordinates[start:start + batch_size] for start in range(0, len(coordinates), batch_size))
+    centers, _ = Mini_Batch_Lloyd(batch_source, n_centers, passes, seed)
+    return Build_Facilities(demand_list, centers, Assign_Centers(coordinates, centers))
+
+
+if __name__ == "__main__":
+    import os, tempfile
+    from Facility_Class import Generate_Stream
+    from Meyerson_Algorithm import Calculate_Costs
+    from Lloyd_Vectorized import Lloyd_Clustering_Vectorized
+
+    test_area = (500, 500)
+    test_cost = 25
+    test_stream = Generate_Stream(20000, test_area)
+
+    # in memory, compared with the full Lloyd iterations.
+    test_full = Lloyd_Clustering_Vectorized(test_area, test_stream)
+    test_mini = Mini_Batch_Clustering(test_area, test_stream)
+    print(f"lloyd: \t\t{len(test_full)} Facilities \t{Calculate_Costs(test_full, test_cost)} Costs.")
+    print(f"mini-batch: \t{len(test_mini)} Facilities \t{Calculate_Costs(test_mini, test_cost)} Costs.")
+
+    # streaming from a memory mapped file.
+    test_path = os.path.join(tempfile.mkdtemp(), "demands.npy")
+    np.save(test_path, As_Coordinates(test_stream))
+    test_centers, test_labels, test_total = Mini_Batch_Assignment(lambda: Iterate_Npy_Batches(test_path, 1024), 141, test_cost)
+    print(f"npy stream: \t{len(np.unique(test_labels))} Facilities \t{test_total} Costs.")
+
+    # a one-shot generator is exhausted after the first pass.
+    test_generator = Iterate_Npy_Batches(test_path, 1024)
+    try:
+        Mini_Batch_Assignment(lambda: test_generator, 141, test_cost)
+        raise AssertionError("a one-shot batch source has to fail")
+    except Exception as error:
+        assert "new iterator for every pass" in str(error)
@@ -0,0 +1,151 @@
+import random as rd
+import numpy as np
+import Metrics
+from time import perf_counter
+from Facility_Class import Facility, Cost_Ledger, Facility_List
+from Distance_Kernel import As_Coordinates, Paired_Distances
+
+""" Helper Functions """
+
+# numpy generator for the given seed. without a seed it is drawn from the random module,
+# so rd.seed() makes the vectorized algorithms reproducible as well.
+def Get_Generator(seed: int = None) -> np.random.Generator:
+    if seed is None:
+        seed = rd.getrandbits(64)
+    return np.random.default_rng(seed)
+
+
+""" Seeding """
+
+# uniform random starting centers within the area, like Randomize_Center.
+def Seed_Uniform(area: tuple, n_centers: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.integers(0, np.array(area) + 1, size=(n_centers, len(area))).astype(np.float64)
+
+# k-means++: every further center is a demand drawn proportional to its squared distance to the chosen centers.
+def Seed_Kmeans_PP(coordinates: np.ndarray, n_centers: int, rng: np.random.Generator) -> np.ndarray:
+    centers = np.empty((n_centers, coordinates.shape[1]), dtype=np.float64)
+    centers[0] = coordinates[rng.integers(0, len(coordinates))]
+    closest = np.sum((coordinates - centers[0])**2, axis=1)
+
+    for i in range(1, n_centers):
+        total = np.sum(closest)
+        if total > 0:
+            index = min(np.searchsorted(np.cumsum(closest), rng.random() * total, side="right"), len(coordinates) - 1)
+        else:
+            index = rng.integers(0, len(coordinates))
+        centers[i] = coordinates[index]
+        closest = np.minimum(closest, np.sum((coordinates - centers[i])**2, axis=1))
+
+    return centers
+
+
+""" Lloyd Iterations """
+
+# assigns every point to its closest center with one argmin per block. ties go to the lower center index.
+# |x|^2 is the same for all centers of a point, so only |c|^2 - 2<x, c> is compared.
+def Assign_Centers(coordinates: np.ndarray, centers: np.ndarray, block_size: int = 8192) -> np.ndarray:
+    labels = np.empty(len(coordinates), dtype=np.int64)
+    if Metrics.Enabled:
+        Metrics.Increment("distance_evaluations", len(coordinates) * len(centers))
+    centers_squared = np.sum(centers**2, axis=1)
+    for start in range(0, len(coordinates), block_size):
+        scores = coordinates[start:start + block_size] @ (-2 * centers.T)
+        scores += centers_squared
+        labels[start:start + block_size] = np.argmin(scores, axis=1)
+    return labels
+
+# mean of every cluster. empty clusters keep their previous center.
+def Update_Centers_Vectorized(coordinates: np.ndarray, labels: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    counts = np.bincount(labels, minlength=len(centers))
+    sums = np.stack([np.bincount(labels, weights=coordinates[:, j], minlength=len(centers)) for j in range(0, coordinates.shape[1])], axis=1)
+
+    updated = centers.copy()
+    filled = counts > 0
+    updated[filled] = sums[filled] / counts[filled, None]
+    return updated
+
+# runs Lloyd's iterations until the assignment is stable, the centers move less than the tolerance
+# or max_iterations is reached. returns the centers, the labels of the final centers and the iterations used.
+def Lloyd_Iterate(coordinates: np.ndarray, centers: np.ndarray, max_iterations: int = 100, tolerance: float = 1e-4) -> tuple:
+    labels = Assign_Centers(coordinates, centers)
+    for iteration in range(1, max_iterations + 1):
+        if Metrics.Enabled:
+            start = perf_counter()
+        new_centers = Update_Centers_Vectorized(coordinates, labels, centers)
+        shift = np.max(np.sqrt(np.sum((new_centers - centers)**2, axis=1)))
+        centers = new_centers
+
+        new_labels = Assign_Centers(coordinates, centers)
+        stable = np.array_equal(labels, new_labels)
+        labels = new_labels
+        if Metrics.Enabled:
+            Metrics.Increment("lloyd_iterations", algorithm="lloyd_vectorized")
+            Metrics.Observe("lloyd_iteration_seconds", perf_counter() - start, algorithm="lloyd_vectorized")
+        if stable or shift < tolerance:
+            return (centers, labels, iteration)
+
+    return (centers, labels, max_iterations)
+
+# builds the facilities from the final labels, clusters without demands are dropped.
+# the distances to the rounded centers are recorded in the ledger of the result.
+def Build_Facilities(demand_list: list, centers: np.ndarray, labels: np.ndarray) -> list[Facility]:
+    centers = np.around(centers, decimals=3)
+    order = np.argsort(labels, kind="stable")
+    offsets = np.searchsorted(labels[order], np.arange(0, len(centers) + 1))
+
+    facilities = Facility_List(ledger=Cost_Ledger())
+    for k in range(0, len(centers)):
+        members = order[offsets[k]:offsets[k + 1]]
+        if len(members) == 0:
+            continue
+        facility = Facility(tuple(centers[k].tolist()), demand_list[members[0]])
+        for index in members[1:]:
+            facility.Add_Service(demand_list[index])
+        facilities.append(facility)
+
+    facilities.ledger.Attach(facilities)
+    facilities.ledger.Connect_Many(Paired_Distances(As_Coordinates(demand_list)[order], centers[labels[order]], 4))
+    return facilities
+
+
+""" Clustering """
+
+# vectorized version of Lloyd_Clustering with early stopping. seeding is "kmeans++" or "uniform".
+# n_centers defaults to sqrt(#demands) like Center_Range.
+def Lloyd_Clustering_Vectorized(area: tuple, demand_list: list, iteration: int = 100, tolerance: float = 1e-4,
+                                seeding: str = "kmeans++", n_centers: int = None, seed: int = None) -> list[Facility]:
+    if len(demand_list) == 0:
+        return []
+
+    rng = Get_Generator(seed)
+    coordinates = As_Coordinates(demand_list)
+    if n_centers is None:
+        n_centers = max(int(np.sqrt(len(demand_list))), 1)
+
+    if seeding == "kmeans++":
+        centers = Seed_Kmeans_PP(coordinates, n_centers, rng)
+    elif seeding == "uniform":
+        centers = Seed_Uniform(area, n_centers, rng)
+    else:
+        raise Exception(f"\n\tSeeding '{seeding}' is not valid.")
+
+    centers, labels, _ = Lloyd_Iterate(coordinates, centers, iteration, tolerance)
+    return Build_Facilities(demand_list, centers, labels)
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from Facility_Class import Generate_Stream
+    from Meyerson_Algorithm import Lloyd_Clustering, Calculate_Costs
+
+    # comparing the vectorized engine with Lloyd_Clustering.
+    test_area = (500, 500)
+    test_stream = Generate_Stream(20000, test_area)
+
+    start = perf_counter()
+    test_lloyd = Lloyd_Clustering(test_area, test_stream, iteration=10)
+    print(f"lloyd: \t\t{len(test_lloyd)} Facilities \t{Calculate_Costs(test_lloyd, 25)} Costs \t{perf_counter() - start} sec.")
+
+    start = perf_counter()
+    test_vectorized = Lloyd_Clustering_Vectorized(test_area, test_stream)
+    print(f"vectorized: \t{len(test_vectorized)} Facilities \t{Calculate_Costs(test_vectorized, 25)} Costs \t{perf_counter() - start} sec.")
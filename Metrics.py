@@ -0,0 +1,245 @@
+import json
+import functools
+from bisect import bisect_left
+from time import perf_counter
+
+""" Settings """
+
+# the hooks in the algorithms only check this flag while the metrics are disabled.
+Enabled = False
+
+# upper bounds of the histogram buckets, from 1 microsecond to 100 seconds (and counts up to 10**5).
+Default_Buckets = tuple(m * 10.0**e for e in range(-6, 2) for m in (1, 2.5, 5)) + (100.0,)
+Count_Buckets = tuple(m * 10**e for e in range(0, 5) for m in (1, 2, 5)) + (100000,)
+
+
+""" Classes Metrics """
+
+# cumulative histogram in the Prometheus layout: counts per upper bound, sum and count of all values.
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple = Default_Buckets) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    # count observations of the same value at once.
+    def Observe(self, value: float, count: int = 1) -> None:
+        self.counts[bisect_left(self.buckets, value)] += count
+        self.sum += count * value
+        self.count += count
+
+    # estimated quantile, interpolated linearly inside the bucket containing it like histogram_quantile of
+    # Prometheus. the first bucket starts at 0, values above the last bound are reported as the last bound.
+    def Quantile(self, q: float) -> float:
+        rank, seen = q * self.count, 0
+        for i, count in enumerate(self.counts):
+            if count > 0 and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return float("nan")
+
+
+# counters and histograms, identified by their name and labels.
+class Registry:
+    def __init__(self) -> None:
+        self.counters = {}
+        self.histograms = {}
+        self.descriptions = {}
+
+    def Increment(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def Observe(self, name: str, value: float, buckets: tuple = Default_Buckets, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(buckets)
+        self.histograms[key].Observe(value)
+
+    def Describe(self, name: str, description: str) -> None:
+        self.descriptions[name] = description
+
+    def Reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+
+    def To_Dict(self) -> dict:
+        counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self.counters.items())]
+        histograms = [{"name": name, "labels": dict(labels), "count": item.count, "sum": item.sum,
+                       "buckets": dict(zip([str(bound) for bound in item.buckets] + ["+Inf"], Cumulative(item.counts))),
+                       "p50": item.Quantile(0.5), "p99": item.Quantile(0.99)}
+                      for (name, labels), item in sorted(self.histograms.items())]
+        return {"counters": counters, "histograms": histograms}
+
+    # text exposition format of Prometheus.
+    def To_Prometheus(self) -> str:
+        lines, described = [], set()
+
+        def Header(name: str, kind: str) -> None:
+            if name not in described:
+                described.add(name)
+                if name in self.descriptions:
+                    lines.append(f"# HELP {name} {self.descriptions[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            Header(f"{name}_total", "counter")
+            lines.append(f"{name}_total{Format_Labels(labels)} {value}")
+        for (name, labels), item in sorted(self.histograms.items()):
+            Header(name, "histogram")
+            for bound, count in zip([repr(bound) for bound in item.buckets] + ["+Inf"], Cumulative(item.counts)):
+                lines.append(f"{name}_bucket{Format_Labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_sum{Format_Labels(labels)} {item.sum}")
+            lines.append(f"{name}_count{Format_Labels(labels)} {item.count}")
+        return "\n".join(lines) + "\n"
+
+
+# records the time of a block into a histogram, only measured if the metrics are enabled.
+class Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, **labels) -> None:
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self) -> "Timer":
+        if Enabled:
+            self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        if self.start is not None:
+            Default.Observe(self.name, perf_counter() - self.start, **self.labels)
+            self.start = None
+
+
+# decorator recording the time of every call into a histogram, the call is passed through while disabled.
+def Timed(name: str, **labels):
+    def Decorator(function):
+        @functools.wraps(function)
+        def Wrapper(*args, **kwargs):
+            if not Enabled:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                Default.Observe(name, perf_counter() - start, **labels)
+        return Wrapper
+    return Decorator
+
+
+""" Helper Functions """
+
+def Cumulative(counts: list) -> list:
+    total, result = 0, []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+def Format_Labels(labels: tuple) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+""" Functions """
+
+# the registry used by all hooks.
+Default = Registry()
+
+def Enable(reset: bool = True) -> None:
+    global Enabled
+    if reset:
+        Default.Reset()
+    Enabled = True
+
+def Disable() -> None:
+    global Enabled
+    Enabled = False
+
+# the hooks call these only after checking Enabled themselves, they can be used directly as well.
+def Increment(name: str, value: float = 1, **labels) -> None:
+    if Enabled:
+        Default.Increment(name, value, **labels)
+
+def Observe(name: str, value: float, buckets: tuple = Default_Buckets, **labels) -> None:
+    if Enabled:
+        Default.Observe(name, value, buckets, **labels)
+
+def Export_Json(path: str = None) -> str:
+    text = json.dumps(Default.To_Dict(), indent=2)
+    if path is not None:
+        with open(path, "w") as file:
+            file.write(text)
+    return text
+
+def Export_Prometheus(path: str = None) -> str:
+    text = Default.To_Prometheus()
+    if path is not None:
+        with open(path, "w") as file:
+            file.write(text)
+    return text
+
+
+Default.Describe("distance_evaluations_total", "Point to point distances computed by the Distance_Kernel functions.")
+Default.Describe("facilities_opened_total", "Facilities opened by the online algorithms.")
+Default.Describe("demands_connected_total", "Demands connected to an existing facility.")
+Default.Describe("meyerson_search_seconds", "Nearest facility search of one demand.")
+Default.Describe("meyerson_demand_seconds", "Whole Add_Demand call of one demand.")
+Default.Describe("lloyd_iterations_total", "Lloyd iterations run.")
+Default.Describe("lloyd_iteration_seconds", "Time of one Lloyd iteration.")
+Default.Describe("calculate_costs_seconds", "Time of one Calculate_Costs call.")
+Default.Describe("draw_seconds", "Time of one Draw_* Save or Draw_Animation Update call.")
+Default.Describe("meyerson_update_seconds", "Coin flip and facility update of one demand.")
+
+
+if __name__ == "__main__":
+    import random as rd
+    import numpy as np
+    # the hooks use the imported module, not this __main__ one.
+    import Metrics
+    import matplotlib
+    matplotlib.use("Agg")
+    from Facility_Class import Generate_Stream
+    from Meyerson_Class import Meyerson
+    from Meyerson_Algorithm import Lloyd_Clustering, Calculate_Costs
+    import Draw_Classes, tempfile
+
+    test_area = (300, 300)
+    test_stream = Generate_Stream(20000, test_area)
+
+    # overhead of the disabled hooks against the enabled ones.
+    for enabled in [False, True]:
+        Metrics.Enable() if enabled else Metrics.Disable()
+        rd.seed(1)
+        test_meyerson = Meyerson(test_area, 25, 1)
+        start = perf_counter()
+        for demand in test_stream:
+            test_meyerson.Add_Demand(demand)
+        print(f"enabled={enabled}: \t{np.around(perf_counter() - start, 4)} sec.")
+
+    Lloyd_Clustering(test_area, test_stream[:3000])
+    Calculate_Costs(list(test_meyerson.facilities), 25)
+    Draw_Classes.Save_Path = tempfile.mkdtemp()
+    Draw_Classes.Draw(test_area, test_stream[:500], [], 0).Save("metrics_test", dpi=50)
+
+    test_json = json.loads(Metrics.Export_Json())
+    assert any(item["name"] == "facilities_opened" and item["value"] == len(test_meyerson.facilities) for item in test_json["counters"])
+    print(Metrics.Export_Prometheus())
+
+    # the quantiles are interpolated inside the bucket, not its upper bound.
+    test_histogram = Histogram()
+    test_values = np.random.default_rng(0).uniform(0.1, 0.25, 10000)
+    for value in test_values:
+        test_histogram.Observe(value)
+    for q in [0.5, 0.99]:
+        assert abs(test_histogram.Quantile(q) - np.quantile(test_values, q)) < 0.005
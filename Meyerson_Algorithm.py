@@ -1,8 +1,23 @@
+import importlib
 import random as rd
 import numpy as np
+import Metrics
 from time import perf_counter
-from Facility_Class import Facility, Demand, Generate_Stream
-from Draw_Classes import Draw, Draw_Comparison
+from Facility_Class import Facility, Demand, Cost_Ledger, Facility_List, Generate_Stream
+from Facility_Index import Facility_Grid
+from Facility_Store import Demand_Store
+from Distance_Kernel import As_Coordinates, Point_Distances, Paired_Distances
+from Lloyd_Vectorized import Lloyd_Clustering_Vectorized
+from UFL_Solver import UFL_Clustering
+
+# the plotting layer (matplotlib) is only imported once it is used, see __getattr__.
+Lazy_Imports = {"Draw": "Draw_Classes", "Draw_Comparison": "Draw_Classes", "Export_Comparisons": "Frame_Export"}
+
+def __getattr__(name: str):
+    if name in Lazy_Imports:
+        return getattr(importlib.import_module(Lazy_Imports[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 """ Helper Functions """
 
@@ -10,16 +25,22 @@ def Round(values: float, decimals: int) -> float:
     return np.around(values, decimals=decimals)
 
 # calculates the distance (ordinary norm) of two points and rounds it to 4 decimal places.
+# kept for single pairs, loops over many points should use the kernels in Distance_Kernel.
 def Euclidean_Norm(point_1, point_2) -> float:
-    return Round(np.linalg.norm(np.array(point_1) - np.array(point_2)), 4)
+    return Point_Distances(point_1, [point_2], 4)[0]
 
 # find the closest facility based on the norm. returns the distance and the facility.
-def Find_Nearest_Facility(demand: Demand, facility_list: list) -> tuple:
+# a Facility_Grid is searched through its index, a plain list by brute-force. with epsilon > 0 the grid
+# may return a facility up to (1 + epsilon) times farther away than the closest one.
+def Find_Nearest_Facility(demand: Demand, facility_list: list, epsilon: float = None) -> tuple:
     # base case if facility_list is still empty (1. iteration). 
     if len(facility_list) == 0:
         return (10000, None)
+
+    if isinstance(facility_list, Facility_Grid):
+        return facility_list.Nearest(demand.position, epsilon)
     
-    norm = [Euclidean_Norm(demand.position, facility.position) for facility in facility_list]
+    norm = Point_Distances(demand.position, facility_list, 4)
     return (np.min(norm), facility_list[np.argmin(norm)])
 
 # calculates the relative distance based on the cost of opening a new facility.
@@ -31,11 +52,19 @@ def q_Get_Probability(q, distance: float, cost: int) -> float:
 def Flip_Coin(prob: float) -> bool:
     return rd.random() < prob
 
+# counters of an online run, taken from its ledger after the run.
+def Record_Online_Metrics(facilities: list, demands: int, algorithm: str) -> None:
+    if Metrics.Enabled:
+        Metrics.Increment("facilities_opened", facilities.ledger.opened, algorithm=algorithm)
+        Metrics.Increment("demands_connected", demands - facilities.ledger.opened, algorithm=algorithm)
+
 
 """ Meyerson's Algorithm """
 
-def Meyerson_Algorithm_Online(demand_list: list, facility_cost: int = 1) -> list[Facility]:
-    facilities_list = []
+# epsilon > 0 searches the facilities approximately, see Facility_Grid.
+def Meyerson_Algorithm_Online(demand_list: list, facility_cost: int = 1, epsilon: float = 0) -> list[Facility]:
+    facilities_list = Facility_Grid(facility_cost, epsilon=epsilon)
+    facilities_list.ledger = Cost_Ledger()
     for demand in demand_list:
         # calculate the relevent values
         norm, next_facility = Find_Nearest_Facility(demand, facilities_list)
@@ -44,15 +73,19 @@ def Meyerson_Algorithm_Online(demand_list: list, facility_cost: int = 1) -> list
         if Flip_Coin(probability_facility):
             # opens up a new facility.
             facilities_list.append(Facility(demand.position, demand))
+            facilities_list.ledger.Open()
         else:
             # uses already existing facility.
             next_facility.Add_Service(demand)
-    
+            facilities_list.ledger.Connect(norm)
+
+    Record_Online_Metrics(facilities_list, len(demand_list), "meyerson")
     return facilities_list
 
 
-def q_Meyerson_Algorithm_Online(q: float, demand_list: list, facility_cost: int = 1) -> list[Facility]:
-    facilities_list = []
+def q_Meyerson_Algorithm_Online(q: float, demand_list: list, facility_cost: int = 1, epsilon: float = 0) -> list[Facility]:
+    facilities_list = Facility_Grid(facility_cost, epsilon=epsilon)
+    facilities_list.ledger = Cost_Ledger()
     for demand in demand_list:
         # calculate the relevent values
         norm, next_facility = Find_Nearest_Facility(demand, facilities_list)
@@ -61,12 +94,16 @@ def q_Meyerson_Algorithm_Online(q: float, demand_list: list, facility_cost: int
         if Flip_Coin(probability_facility):
             # opens up a new facility.
             facilities_list.append(Facility(demand.position, demand))
+            facilities_list.ledger.Open()
         else:
             # uses already existing facility.
             next_facility.Add_Service(demand)
-    
+            facilities_list.ledger.Connect(norm)
+
+    Record_Online_Metrics(facilities_list, len(demand_list), "q_meyerson")
     return facilities_list
 
+
 """ Clustering """
 
 # Use the squar root of the amount of facilities.
@@ -78,17 +115,32 @@ def Randomize_Center(area: tuple) -> tuple:
     return (rd.randint(0, area[0]), rd.randint(0, area[1]))
 
 
-def Find_Nearest_Center(demand: Demand, centers: list) -> tuple:
-    distances = [Euclidean_Norm(demand.position, center) for center in centers]
-    nearest_center = np.argmin(distances)
-    return centers[nearest_center]
+# returns the index of the nearest center and its distance. with an index (Center_Index) over the centers
+# the search goes through the grid, approximate for epsilon > 0.
+def Find_Nearest_Center(demand: Demand, centers: list, index: Facility_Grid = None, epsilon: float = None) -> tuple:
+    if index is not None:
+        norm, order, center = index.Search(demand.position, epsilon)
+        return (order, norm)
+    distances = Point_Distances(demand.position, centers, 4)
+    nearest_center = int(np.argmin(distances))
+    return (nearest_center, distances[nearest_center])
+
+
+# below this many centers a single kernel call over all centers is faster than the grid search, exact or not
+# (3000 demands in 2 dimensions: the grid breaks even around 500 centers and is 10x faster at 5000).
+Index_Min_Centers = 500
+
+# grid over the centers of one iteration, the cells are about as large as the area per center.
+def Center_Index(area: tuple, centers: list, epsilon: float = 0) -> Facility_Grid:
+    store = Demand_Store(len(area))
+    cell_size = (np.prod(np.array(area, dtype=np.float64) + 1) / max(len(centers), 1)) ** (1 / len(area))
+    return Facility_Grid(cell_size, [store.Open_Facility(center) for center in centers], epsilon)
 
 
 def Calculate_Mean_Center(demands: list) -> tuple:
     len_ = len(demands)
-    x_val = [demand.position[0] for demand in demands]
-    y_val = [demand.position[1] for demand in demands]
-    return (Round(np.sum(x_val) / len_, 3), Round(np.sum(y_val) / len_, 3))
+    coordinates = As_Coordinates(demands)
+    return tuple(Round(np.sum(coordinates, axis=0) / len_, 3))
 
 
 def Update_Centers(clusters: list) -> list[tuple]:
@@ -103,39 +155,77 @@ def Assign_Demand_to_Center(center: tuple, demands: list) -> Facility:
     return facility
 
 
-def Lloyd_Clustering(area: tuple, demand_list: list, iteration: int = 5) -> list[Facility]:
+# with epsilon and at least Index_Min_Centers centers the nearest centers are searched approximately
+# through a Center_Index, with fewer centers epsilon has no effect.
+# the facilities are the final means of the filled clusters, their distances are recorded in the ledger.
+def Lloyd_Clustering(area: tuple, demand_list: list, iteration: int = 5, epsilon: float = None) -> list[Facility]:
     centers = [Randomize_Center(area) for i in range(0, Center_Range(len(demand_list)))]
 
     for i in range(0, iteration):
+        if Metrics.Enabled:
+            start = perf_counter()
         clusters = [[] for center in centers]
+        center_index = Center_Index(area, centers, epsilon) if epsilon is not None and len(centers) >= Index_Min_Centers else None
 
         for demand in demand_list:
-            nearest_center = Find_Nearest_Center(demand, centers)
-            index = centers.index(nearest_center)
+            index, norm = Find_Nearest_Center(demand, centers, center_index)
             clusters[index].append(demand)
 
         centers = Update_Centers(clusters)
+        if Metrics.Enabled:
+            Metrics.Increment("lloyd_iterations", algorithm="lloyd")
+            Metrics.Observe("lloyd_iteration_seconds", perf_counter() - start, algorithm="lloyd")
 
-    return [Assign_Demand_to_Center(center, cluster) for center, cluster in zip(centers, clusters)]
+    # Update_Centers drops the empty clusters, so the centers belong to the filled ones.
+    clusters = [cluster for cluster in clusters if len(cluster) > 0]
+    facilities = Facility_List([Assign_Demand_to_Center(center, cluster) for center, cluster in zip(centers, clusters)], Cost_Ledger())
+    facilities.ledger.Attach(facilities)
+    if len(facilities) > 0:
+        positions = np.repeat(np.array(centers, dtype=np.float64), [len(cluster) for cluster in clusters], axis=0)
+        facilities.ledger.Connect_Many(Paired_Distances(As_Coordinates([demand for cluster in clusters for demand in cluster]), positions, 4))
+    return facilities
 
     
 
 """ Cost Function """
 # Calculates formula: |F|*f + \sum d(F, u)
 # where F: facilities, f: opening costs, d(F,u): distance from demand to the closest facility.
+# the ledger recorded by the algorithms is used if it still matches the facilities.
 def Calculate_Costs(facilities: list, facility_cost: int) -> float:
-    total_cost = 0
-    for facility in facilities:
-        total_cost += facility_cost
+    with Metrics.Timer("calculate_costs_seconds"):
+        ledger = getattr(facilities, "ledger", None)
+        if ledger is not None and ledger.mutations == getattr(facilities, "mutations", None) and ledger.opened == len(facilities):
+            return Round(ledger.Total(facility_cost), 2)
 
-        for demand in facility.service:
-            total_cost += Euclidean_Norm(facility.position, demand.position)
-    
-    return Round(total_cost, 2)
+        total_cost = 0
+        for facility in facilities:
+            total_cost += facility_cost
+            total_cost += np.sum(Point_Distances(facility.position, facility.service, 4))
+
+        return Round(total_cost, 2)
 
 
 """ Test Function """
 
+# runs the algorithm selected by option on the input stream.
+# options = ["meyerson", "q_meyerson", "lloyd", "lloyd_vectorized", "ufl"]
+# epsilon selects the approximate nearest search for meyerson, q_meyerson and lloyd.
+def Run_Algorithm(option: str, area: tuple, input_stream: list, costs: int, q: float = 0.5, iteration: int = 10,
+                  epsilon: float = None) -> list[Facility]:
+    if option == "meyerson":
+        return Meyerson_Algorithm_Online(input_stream, costs, epsilon or 0)
+    elif option == "q_meyerson":
+        return q_Meyerson_Algorithm_Online(q, input_stream, costs, epsilon or 0)
+    elif option == "lloyd":
+        return Lloyd_Clustering(area, input_stream, iteration=iteration, epsilon=epsilon)
+    elif option == "lloyd_vectorized":
+        return Lloyd_Clustering_Vectorized(area, input_stream)
+    elif option == "ufl":
+        return UFL_Clustering(input_stream, costs)
+    else:
+        raise Exception(f"\n\tOption '{option}' is not valid.")
+
+
 def Sample_Size(area: tuple, frac: float = 0.1) -> int:
     upper_bound = Round((area[0] * area[1])*frac, 0)
     if upper_bound <= 2:
@@ -167,8 +257,8 @@ def Print_Results(results: list, option: str) -> None:
 
 
 def Test_Algorithm(iterations: int, area: tuple, costs: int, option: str = "meyerson", q: float = 0.5, timing: bool = False) -> list:
-    # options = ["meyerson", "q_meyerson", "lloyd"]
-    if timing: start = perf_counter()
+    # options: see Run_Algorithm
+    start = perf_counter()
     results_alg = []
     # creating the instances
     for i in range(0, iterations):
@@ -178,14 +268,7 @@ def Test_Algorithm(iterations: int, area: tuple, costs: int, option: str = "meye
         input_stream = Generate_Stream(sample_size, area)
 
         # calculate facilities.
-        if option == "meyerson":
-            test_facilities = Meyerson_Algorithm_Online(input_stream, costs)
-        elif option == "q_meyerson":
-            test_facilities = q_Meyerson_Algorithm_Online(q, input_stream, costs)
-        elif option == "lloyd":
-            test_facilities = Lloyd_Clustering(area, input_stream, iteration=10)
-        else:
-            raise Exception(f"\n\tOption '{option}' is not valid.")
+        test_facilities = Run_Algorithm(option, area, input_stream, costs, q)
 
         if timing: iter_facilities_time = perf_counter()
 
@@ -207,7 +290,7 @@ def Test_Algorithm(iterations: int, area: tuple, costs: int, option: str = "meye
 # compares the three algorithms, namely Meyerson, q-meyerson, lloyd
 # returns list consisting of [#demand, [Facility, cost], [Facility, cost], [Facility, cost]]
 def Compare_Algorithms(iterations: int, area: tuple, costs: int, q: float = 0.5, timing: bool = False) -> list:
-    if timing: start = perf_counter()
+    start = perf_counter()
     results_alg = []
     # start of the simulation
     for i in range(0, iterations):
@@ -243,7 +326,15 @@ def Compare_Algorithms(iterations: int, area: tuple, costs: int, q: float = 0.5,
 
 """ Plot Comparison """
 
-def Plot_Comparison(area: tuple, costs: int, results: list, save: bool = False) -> None:
+# with workers the images are saved in parallel by Export_Comparisons.
+def Plot_Comparison(area: tuple, costs: int, results: list, save: bool = False, workers: int = None) -> None:
+    from Draw_Classes import Draw_Comparison
+    from Frame_Export import Export_Comparisons
+
+    if save and workers is not None:
+        Export_Comparisons(area, costs, results, workers=workers)
+        return
+
     for i, result in enumerate(results):
         sample_size = result[0]
         cache = Draw_Comparison(area, costs, sample_size, result[1], result[2], result[3])
@@ -1,42 +1,159 @@
+import importlib
 import numpy as np
+import random as rd
 import os
-from Facility_Class import Facility, Demand, Generate_Stream, Generate_Bias_Stream
+import Metrics
+from time import perf_counter
+from Facility_Class import Facility, Demand, Cost_Ledger, Generate_Stream, Generate_Bias_Stream
 from Meyerson_Algorithm import *
-from Draw_Classes import Draw, Draw_Map
+from Facility_Index import Facility_Grid
+from Facility_Store import Demand_Store, Demand_View
+
+# the plotting layer (matplotlib) is only imported once it is used, see __getattr__.
+Lazy_Imports = {"Draw": "Draw_Classes", "Draw_Map": "Draw_Classes", "Draw_Comparison": "Draw_Classes",
+                "Draw_Animation": "Draw_Classes", "Write_PNG_Frames": "Draw_Classes",
+                "Write_Animated_File": "Draw_Classes", "Export_Slides": "Frame_Export"}
+
+def __getattr__(name: str):
+    if name in Lazy_Imports:
+        return getattr(importlib.import_module(Lazy_Imports[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class Meyerson:
-    def __init__(self, area: tuple = (10, 10), cost: int = 5, q: float = 0.5) -> None:
+    # with a Demand_Store the demands and facilities are kept in its columnar arrays.
+    def __init__(self, area: tuple = (10, 10), cost: int = 5, q: float = 0.5, store: Demand_Store = None) -> None:
         self.area = area
         self.q_value = q
         self.faclility_cost = cost
         self.total_cost = 0
-        self.demands = []
-        self.facilities = []
+        self.store = store
+        self.demands = [] if store is None else store.Demands()
+        self.facilities = Facility_Grid(cost)
+        self.facilities.ledger = Cost_Ledger()
 
+    # with Metrics enabled the search and the whole call are timed per demand.
     def Add_Demand(self, demand: Demand) -> None:
-        self.demands.append(demand)
+        if Metrics.Enabled:
+            start = perf_counter()
+        if self.store is None:
+            self.demands.append(demand)
+        elif not (isinstance(demand, Demand_View) and demand.store is self.store):
+            demand = self.store.Add_Demand(demand.position)
 
         norm, next_facility = Find_Nearest_Facility(demand, self.facilities)
+        if Metrics.Enabled:
+            searched = perf_counter()
         probability = q_Get_Probability(self.q_value, norm, self.faclility_cost)
 
-        if Flip_Coin(probability):
-            self.facilities.append(Facility(demand.position, demand))
+        if opened := Flip_Coin(probability):
+            self.facilities.append(self.Open_Facility(demand))
+            self.facilities.ledger.Open()
             self.total_cost = np.around(self.total_cost + self.faclility_cost, decimals= 3) 
         else:
             next_facility.Add_Service(demand)
+            self.facilities.ledger.Connect(norm)
             self.total_cost = np.around(self.total_cost + norm, decimals= 3) 
 
-def Create_Basic_Slides(meyerson: Meyerson, demand_list: list, file_name: str = "test_slide_show") -> None:
-    for i, demand in enumerate(demand_list):
-        save_name = f"{file_name}_{i}"
+        if Metrics.Enabled:
+            end = perf_counter()
+            Metrics.Increment("facilities_opened" if opened else "demands_connected", algorithm="meyerson_class")
+            Metrics.Observe("meyerson_search_seconds", searched - start)
+            Metrics.Observe("meyerson_update_seconds", end - searched)
+            Metrics.Observe("meyerson_demand_seconds", end - start)
+
+    # adds a block of arrivals given as an (n, d) coordinate array. makes exactly the same decisions as
+    # calling Add_Demand for every row: the coin flips are drawn up front from the same random stream and
+    # the probability uses the same rounding. total_cost is only rounded once at the end of the block.
+    # returns the index of the serving facility in self.facilities and the incremental cost of every arrival.
+    def Add_Many(self, coordinates: np.ndarray) -> tuple:
+        coordinates = np.asarray(coordinates)
+        if self.store is None:
+            demands = [Demand(tuple(position)) for position in coordinates.tolist()]
+            self.demands.extend(demands)
+        else:
+            demands = self.store.Add_Demands(coordinates)
+
+        coins = np.array([rd.random() for i in range(0, len(demands))])
+        facility_index = np.empty(len(demands), dtype=np.int64)
+        costs = np.empty(len(demands), dtype=np.float64)
+        facilities = self.facilities
+        ledger = facilities.ledger
+        opened = ledger.opened
+
+        # the nearest facilities of the whole block are searched at once. a facility opened within the block
+        # lowers the distances of the later arrivals in one vectorized step, ties stay with the earlier facility.
+        coordinates = As_Coordinates(coordinates).astype(np.float64)
+        norms, orders = facilities.Search_Many(coordinates)
+        for i, demand in enumerate(demands):
+            order = int(orders[i])
+            found = (norms[i], order, facilities[order] if order >= 0 else None)
+            size = len(facilities)
+            facility_index[i], costs[i] = self.Place(demand, coins[i], found)
+            if len(facilities) > size and i + 1 < len(demands):
+                distances = Point_Distances(coordinates[i], coordinates[i + 1:], 4)
+                closer = (distances < norms[i + 1:]) | (orders[i + 1:] < 0)
+                norms[i + 1:][closer] = distances[closer]
+                orders[i + 1:][closer] = size
+
+        self.total_cost = np.around(self.total_cost + np.sum(costs), decimals= 3)
+        if Metrics.Enabled:
+            Metrics.Increment("facilities_opened", ledger.opened - opened, algorithm="meyerson_class")
+            Metrics.Increment("demands_connected", len(demands) - ledger.opened + opened, algorithm="meyerson_class")
+        return (facility_index, costs)
+
+    # opens a facility at the demand or connects it to the nearest one, with coin as the coin flip. found is the
+    # result of the nearest search (norm, order, facility) if it is already known. returns the index of the
+    # serving facility in self.facilities and the incremental cost, total_cost is left to the caller.
+    def Place(self, demand: Demand, coin: float, found: tuple = None) -> tuple:
+        facilities = self.facilities
+        norm, order, next_facility = found if found is not None else facilities.Search(demand.position)
+        # same as q_Get_Probability, np.around(x, 3) is rint(x * 1000) / 1000.
+        probability = min(self.q_value * (round(float(norm) / self.faclility_cost * 1000) / 1000), 1)
+
+        if coin < probability:
+            facilities.append(self.Open_Facility(demand))
+            facilities.ledger.Open()
+            return (len(facilities) - 1, self.faclility_cost)
+        next_facility.Add_Service(demand)
+        facilities.ledger.Connect(norm)
+        return (order, norm)
+
+    def Open_Facility(self, demand: Demand) -> Facility:
+        if self.store is None:
+            return Facility(demand.position, demand)
+        return self.store.Open_Facility(demand.position, demand)
+
+# adds the demands one by one and yields a frame after each of them. the frames are drawn incrementally
+# on a single figure, with img as cached background image.
+def Generate_Frames(meyerson: Meyerson, demand_list: list, img: str = None, dpi: int = 100):
+    from Draw_Classes import Draw_Animation
+    animation = Draw_Animation(meyerson.area, img, dpi)
+    for demand in demand_list:
         meyerson.Add_Demand(demand)
-        Draw(meyerson.area, meyerson.demands, meyerson.facilities, meyerson.total_cost).Save(save_name)
+        yield animation.Update(meyerson.demands, meyerson.facilities, meyerson.total_cost)
+    animation.Close()
 
-def Create_BG_Slides(meyerson: Meyerson, demand_list: list, img_name: str) -> None:
+def Create_Basic_Slides(meyerson: Meyerson, demand_list: list, file_name: str = "test_slide_show", dpi: int = 300) -> None:
+    from Draw_Classes import Write_PNG_Frames
+    Write_PNG_Frames(Generate_Frames(meyerson, demand_list, dpi=dpi), file_name)
+
+def Create_BG_Slides(meyerson: Meyerson, demand_list: list, img_name: str, dpi: int = 300) -> None:
+    from Draw_Classes import Write_PNG_Frames
     save_name = f"{img_name.replace('.png', '') }_BG_Slides"
-    for i, demand in enumerate(demand_list):
-        meyerson.Add_Demand(demand)
-        Draw_Map(meyerson.area, meyerson.demands, meyerson.facilities, img_name, meyerson.total_cost).Save(f"{save_name}_{i}")
+    Write_PNG_Frames(Generate_Frames(meyerson, demand_list, img_name, dpi), save_name)
+
+# like Create_Basic_Slides / Create_BG_Slides, with the frames rendered by a pool of workers.
+def Create_Slides_Parallel(meyerson: Meyerson, demand_list: list, file_name: str = "test_slide_show", img: str = None,
+                           dpi: int = 300, workers: int = None) -> None:
+    from Frame_Export import Export_Slides
+    Export_Slides(meyerson, demand_list, file_name, img, dpi, workers)
+
+# the whole slide show as a single animated file (gif, or any ffmpeg format like mp4).
+def Create_Animation(meyerson: Meyerson, demand_list: list, file_name: str = "test_animation", img: str = None,
+                     format: str = "gif", fps: int = 10, dpi: int = 100) -> None:
+    from Draw_Classes import Write_Animated_File
+    Write_Animated_File(Generate_Frames(meyerson, demand_list, img, dpi), file_name, format, fps)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+import random as rd
+import numpy as np
+from typing import NamedTuple
+from Facility_Class import Facility, Cost_Ledger, Facility_List
+from Facility_Index import Get_Cell, Cell_Ring, Ring_Size, Ring_Cells
+from Distance_Kernel import As_Coordinates, Point_Distances
+
+""" Classes Results """
+
+# result of an ensemble run, one row per replica.
+class Ensemble_Result(NamedTuple):
+    seeds: list
+    costs: np.ndarray           # |F|*f + \sum d(F, u) of every replica, rounded like Calculate_Costs.
+    opened: np.ndarray          # facilities of every replica.
+    labels: np.ndarray          # (K, n) facility index of every demand in its replica.
+    distances: np.ndarray       # (K, n) connection distance of every demand, 0 for the demand opening a facility.
+    facilities: list            # (F_k, d) facility coordinates of every replica.
+
+
+""" Classes Index """
+
+# facilities of all replicas in one grid cell: coordinates, replica and index within the replica.
+class Ensemble_Cell:
+    __slots__ = ("positions", "replicas", "indices", "arrays")
+
+    def __init__(self) -> None:
+        self.positions = []
+        self.replicas = []
+        self.indices = []
+        self.arrays = None
+
+    def Add(self, position: tuple, replica: int, index: int) -> None:
+        self.positions.append(position)
+        self.replicas.append(replica)
+        self.indices.append(index)
+        self.arrays = None
+
+    def Get_Arrays(self) -> tuple:
+        if self.arrays is None:
+            self.arrays = (As_Coordinates(self.positions), np.array(self.replicas), np.array(self.indices))
+        return self.arrays
+
+
+# one uniform grid shared by the facilities of all replicas. a query returns the nearest facility of every
+# replica at once, the distances to all facilities in the visited cells are computed in a single kernel call.
+class Ensemble_Grid:
+    def __init__(self, cell_size: float, replicas: int) -> None:
+        self.cell_size = cell_size if cell_size > 0 else 1
+        self.replicas = replicas
+        self.cells = {}
+        self.lower = None
+        self.upper = None
+
+    def Insert(self, position: tuple, replica: int, index: int) -> None:
+        cell = Get_Cell(position, self.cell_size)
+        if cell not in self.cells:
+            self.cells[cell] = Ensemble_Cell()
+        self.cells[cell].Add(position, replica, index)
+
+        if self.lower is None:
+            self.lower, self.upper = list(cell), list(cell)
+        else:
+            self.lower = [min(l, c) for l, c in zip(self.lower, cell)]
+            self.upper = [max(u, c) for u, c in zip(self.upper, cell)]
+
+    # nearest facility (distance, index) of every replica, ties broken by the index like Facility_Grid.
+    # a replica stops once its nearest facility is certain or everything unseen is farther than cap.
+    # replicas without a facility in reach get (inf, -1).
+    def Search(self, position: tuple, cap: float = np.inf) -> tuple:
+        best = np.full(self.replicas, np.inf)
+        best_index = np.full(self.replicas, -1, dtype=np.int64)
+        if len(self.cells) == 0:
+            return (best, best_index)
+
+        home = Get_Cell(position, self.cell_size)
+        max_ring = max(max(h - l, u - h) for h, l, u in zip(home, self.lower, self.upper))
+        margin = min(min(x - h*self.cell_size, (h + 1)*self.cell_size - x) for x, h in zip(position, home))
+
+        for r in range(0, max_ring + 1):
+            if Ring_Size(r, len(home)) > len(self.cells):
+                # the ring is larger than the grid itself, check the remaining occupied cells directly.
+                self.Closest(position, [cell for key, cell in self.cells.items() if Cell_Ring(key, home) >= r], best, best_index)
+                break
+
+            self.Closest(position, [self.cells[cell] for cell in Ring_Cells(home, r) if cell in self.cells], best, best_index)
+
+            # everything outside of ring r is at least r cells plus the margin away.
+            bound = r*self.cell_size + margin - 0.0001
+            if bound > cap or np.all(bound > best):
+                break
+
+        return (best, best_index)
+
+    # updates the nearest facility of every replica with the facilities of the cells.
+    def Closest(self, position: tuple, cells: list, best: np.ndarray, best_index: np.ndarray) -> None:
+        if len(cells) == 0:
+            return
+        arrays = [cell.Get_Arrays() for cell in cells]
+        replicas = np.concatenate([item[1] for item in arrays])
+        indices = np.concatenate([item[2] for item in arrays])
+        norm = Point_Distances(position, np.concatenate([item[0] for item in arrays]), 4)
+
+        # the closest (norm, index) per replica: sorted by replica, norm and index, the first row of each replica.
+        order = np.lexsort((indices, norm, replicas))
+        sorted_replicas = replicas[order]
+        first = order[np.flatnonzero(np.concatenate(([True], sorted_replicas[1:] != sorted_replicas[:-1])))]
+        replica = replicas[first]
+        better = (norm[first] < best[replica]) | ((norm[first] == best[replica]) & (indices[first] < best_index[replica]))
+        best[replica[better]] = norm[first][better]
+        best_index[replica[better]] = indices[first][better]
+
+
+""" Helper Functions """
+
+# independent seeds of the replicas, derived from a single root seed.
+def Replica_Seeds(seed: int, replicas: int) -> list[int]:
+    children = np.random.SeedSequence(seed).spawn(replicas)
+    return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in children]
+
+# the next block of coin flips of every replica, shape (K, size).
+def Draw_Coins(generators: list, size: int) -> np.ndarray:
+    return np.array([[generator.random() for i in range(0, size)] for generator in generators]).reshape(len(generators), size)
+
+
+""" Ensemble """
+
+# K independent runs of q_Meyerson_Algorithm_Online in lockstep over the same stream. every arrival is
+# searched in all replicas with one query of the shared grid, the coin flips of all replicas are compared
+# at once. replica k makes exactly the decisions of q_Meyerson_Algorithm_Online after rd.seed(seeds[k]).
+def Meyerson_Ensemble(demands, facility_cost: int, replicas: int = 32, q: float = 1, seed: int = 0,
+                      block_size: int = 4096) -> Ensemble_Result:
+    coordinates = As_Coordinates(demands)
+    size = len(coordinates)
+    seeds = Replica_Seeds(seed, replicas)
+    # an empty stream opens nothing, like q_Meyerson_Algorithm_Online.
+    if size == 0:
+        facilities = [np.empty((0, coordinates.shape[1]), dtype=np.float64) for k in range(0, replicas)]
+        return Ensemble_Result(seeds, np.zeros(replicas), np.zeros(replicas, dtype=np.int64),
+                               np.empty((replicas, 0), dtype=np.int32), np.empty((replicas, 0)), facilities)
+    generators = [rd.Random(replica_seed) for replica_seed in seeds]
+
+    grid = Ensemble_Grid(facility_cost, replicas)
+    facilities = [[] for k in range(0, replicas)]
+    opened = np.zeros(replicas, dtype=np.int64)
+    connection = np.zeros(replicas, dtype=np.float64)
+    labels = np.empty((replicas, size), dtype=np.int32)
+    distances = np.empty((replicas, size), dtype=np.float64)
+    # beyond this distance the probability is 1 for every replica, see q_Get_Probability.
+    cap = facility_cost * (1 / q + 0.001) if q > 0 else np.inf
+
+    for start in range(0, size, block_size):
+        coins = Draw_Coins(generators, min(block_size, size - start))
+        for i, position in enumerate(coordinates[start:start + block_size].tolist(), start=start):
+            best, best_index = grid.Search(position, cap)
+            # no facility in reach counts as 10000, like Find_Nearest_Facility.
+            norm = np.where(best_index < 0, 10000, best)
+            probability = np.minimum(q * np.around(norm / facility_cost, decimals=3), 1)
+            opening = coins[:, i - start] < probability
+
+            for k in np.flatnonzero(opening).tolist():
+                grid.Insert(tuple(position), k, int(opened[k]))
+                facilities[k].append(position)
+            labels[:, i] = np.where(opening, opened, best_index)
+            distances[:, i] = np.where(opening, 0, norm)
+            opened += opening
+            connection[~opening] += norm[~opening]
+
+    costs = np.around(opened * facility_cost + connection, decimals=2)
+    facilities = [np.array(items, dtype=np.float64).reshape(-1, coordinates.shape[1]) for items in facilities]
+    return Ensemble_Result(seeds, costs, opened, labels, distances, facilities)
+
+def Best_Replica(result: Ensemble_Result) -> int:
+    return int(np.argmin(result.costs))
+
+# the facilities of one replica as Facility objects serving the Demands of demand_list, with the ledger of the run.
+def Ensemble_Facilities(result: Ensemble_Result, demand_list: list, replica: int = None) -> list[Facility]:
+    replica = Best_Replica(result) if replica is None else replica
+    labels = result.labels[replica]
+    order = np.argsort(labels, kind="stable")
+    offsets = np.searchsorted(labels[order], np.arange(0, result.opened[replica] + 1))
+
+    facilities = Facility_List(ledger=Cost_Ledger())
+    for k, position in enumerate(result.facilities[replica].tolist()):
+        # the first demand of a facility is the one that opened it.
+        members = order[offsets[k]:offsets[k + 1]]
+        facility = Facility(tuple(position), demand_list[members[0]])
+        for index in members[1:]:
+            facility.Add_Service(demand_list[index])
+        facilities.append(facility)
+    facilities.ledger.Attach(facilities)
+    facilities.ledger.Connect_Many(result.distances[replica])
+    return facilities
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from Facility_Class import Generate_Stream
+    from Meyerson_Algorithm import q_Meyerson_Algorithm_Online, Calculate_Costs
+
+    test_area = (500, 500)
+    test_cost = 25
+    test_q = 1
+    test_stream = Generate_Stream(20000, test_area)
+
+    start = perf_counter()
+    test_result = Meyerson_Ensemble(test_stream, test_cost, 32, test_q, seed=1)
+    ensemble_time = perf_counter() - start
+
+    # every replica has to match the sequential run with its seed.
+    single_time = 0
+    for k in [0, 7, Best_Replica(test_result)]:
+        rd.seed(test_result.seeds[k])
+        start = perf_counter()
+        test_single = q_Meyerson_Algorithm_Online(test_q, test_stream, test_cost)
+        single_time = perf_counter() - start
+        assert Calculate_Costs(test_single, test_cost) == test_result.costs[k]
+        assert len(test_single) == test_result.opened[k]
+    assert Calculate_Costs(Ensemble_Facilities(test_result, test_stream), test_cost) == np.min(test_result.costs)
+    # an empty stream gives an empty result.
+    test_empty = Meyerson_Ensemble([], test_cost, 4)
+    assert np.all(test_empty.opened == 0) and len(Ensemble_Facilities(test_empty, [])) == 0
+
+    print(f"costs: \tbest {np.min(test_result.costs)} \tmean {np.around(np.mean(test_result.costs), 2)} \tworst {np.max(test_result.costs)}")
+    print(f"32 replicas: \t{np.around(ensemble_time, 3)} sec. \t1 run: {np.around(single_time, 3)} sec. "
+          f"\t({np.around(ensemble_time / single_time, 2)}x)")
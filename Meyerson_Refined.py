@@ -0,0 +1,152 @@
+import numpy as np
+import random as rd
+from Facility_Class import Facility, Demand
+from Meyerson_Class import Meyerson
+from Distance_Kernel import As_Coordinates, Pairwise_Distances, Paired_Distances
+
+""" Classes Algorithm """
+
+# Meyerson's online algorithm with periodic local Lloyd refinement. once the cost added since the last
+# refinement exceeds drift * (cost after the last refinement), the facilities that served new demands and
+# their neighbours in the grid are refined with a few Lloyd steps on the demands they serve. the thresholds
+# grow with the total cost, so the refinements stay rare and the amortized cost per demand small.
+class Meyerson_Refined(Meyerson):
+    def __init__(self, area: tuple = (10, 10), cost: int = 5, q: float = 0.5, drift: float = 0.2, lloyd_steps: int = 3) -> None:
+        super().__init__(area, cost, q)
+        self.drift = drift
+        self.lloyd_steps = lloyd_steps
+        self.refined_cost = 0
+        self.refinements = 0
+        self.dirty = {}
+
+    def Add_Demand(self, demand: Demand) -> None:
+        super().Add_Demand(demand)
+        self.Check_Refine(demand)
+
+    # like Meyerson.Add_Many, with the refinements of Add_Demand between the arrivals. makes the decisions
+    # of calling Add_Demand for every row. a facility index is the one at the arrival, a later refinement of
+    # the block may move or close the facility.
+    def Add_Many(self, coordinates: np.ndarray) -> tuple:
+        demands = [Demand(tuple(position)) for position in np.asarray(coordinates).tolist()]
+        self.demands.extend(demands)
+        coins = np.array([rd.random() for i in range(0, len(demands))])
+        facility_index = np.empty(len(demands), dtype=np.int64)
+        costs = np.empty(len(demands), dtype=np.float64)
+
+        for i, demand in enumerate(demands):
+            facility_index[i], costs[i] = self.Place(demand, coins[i])
+            self.total_cost = np.around(self.total_cost + costs[i], decimals= 3)
+            self.Check_Refine(demand)
+        return (facility_index, costs)
+
+    def Check_Refine(self, demand: Demand) -> None:
+        self.dirty[id(demand.facility)] = demand.facility
+        if self.total_cost - self.refined_cost > self.drift * max(self.refined_cost, self.faclility_cost):
+            self.Refine()
+
+    # local Lloyd steps on the neighbourhood of all facilities changed since the last refinement.
+    def Refine(self) -> None:
+        affected = {}
+        for facility in self.dirty.values():
+            for neighbour in self.facilities.Neighbours(facility.position):
+                affected[id(neighbour)] = neighbour
+        self.dirty = {}
+        self.refinements += 1
+
+        if len(affected) > 0 and self.lloyd_steps > 0:
+            self.Refine_Facilities(list(affected.values()))
+        self.refined_cost = self.total_cost
+
+    # moves the facilities to the mean of their demands and reassigns every demand to the closest facility
+    # in the neighbourhood of its current one. facilities left without demands are closed. the result is
+    # only kept if the local cost went down.
+    def Refine_Facilities(self, facilities: list[Facility]) -> None:
+        demands = [demand for facility in facilities for demand in facility.service]
+        coordinates = As_Coordinates(demands)
+        centers = As_Coordinates(facilities)
+        labels = np.repeat(np.arange(0, len(facilities)), [len(facility.service) for facility in facilities])
+        cost_before = len(facilities) * self.faclility_cost + np.sum(Paired_Distances(coordinates, centers[labels], 4))
+
+        # candidate facilities of every facility: its grid neighbours within the refined set.
+        index = {id(facility): k for k, facility in enumerate(facilities)}
+        neighbours = [np.array([index[id(item)] for item in self.facilities.Neighbours(facility.position) if id(item) in index])
+                      for facility in facilities]
+
+        for i in range(0, self.lloyd_steps):
+            counts = np.bincount(labels, minlength=len(centers))
+            filled = counts > 0
+            sums = np.stack([np.bincount(labels, weights=coordinates[:, j], minlength=len(centers)) for j in range(0, coordinates.shape[1])], axis=1)
+            centers = centers.copy()
+            centers[filled] = np.around(sums[filled] / counts[filled, None], decimals=3)
+
+            order = np.argsort(labels, kind="stable")
+            offsets = np.searchsorted(labels[order], np.arange(0, len(centers) + 1))
+            new_labels, connection = labels.copy(), np.empty(len(demands))
+            for k in np.nonzero(filled)[0]:
+                members = order[offsets[k]:offsets[k + 1]]
+                candidates = neighbours[k][filled[neighbours[k]]]
+                distances = Pairwise_Distances(coordinates[members], centers[candidates], 4)
+                nearest = np.argmin(distances, axis=1)
+                new_labels[members] = candidates[nearest]
+                connection[members] = distances[np.arange(0, len(members)), nearest]
+            labels = new_labels
+
+        used = np.unique(labels)
+        cost_after = len(used) * self.faclility_cost + np.sum(connection)
+        if cost_after >= cost_before:
+            return
+
+        # apply the refinement: close unused facilities, move the others and rebuild their service lists.
+        used_set = set(used.tolist())
+        for k, facility in enumerate(facilities):
+            if k not in used_set:
+                self.facilities.remove(facility)
+                self.facilities.ledger.Close()
+                continue
+            self.facilities.Move(facility, tuple(centers[k].tolist()))
+            facility.service = []
+        for demand, k in zip(demands, labels):
+            facilities[k].Add_Service(demand)
+
+        # the ledger keeps the distances at arrival, only its totals follow the refinement.
+        self.facilities.ledger.connection_cost += cost_after - cost_before + (len(facilities) - len(used)) * self.faclility_cost
+        self.total_cost = np.around(self.total_cost + cost_after - cost_before, decimals= 3)
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from Facility_Class import Generate_Stream
+    from Meyerson_Algorithm import Calculate_Costs
+    from Lloyd_Vectorized import Lloyd_Clustering_Vectorized
+
+    test_area = (300, 300)
+    test_cost = 25
+    test_stream = Generate_Stream(20000, test_area)
+
+    for name, test_class in [("meyerson", Meyerson), ("refined", Meyerson_Refined)]:
+        rd.seed(1)
+        test_meyerson = test_class(test_area, test_cost, 1)
+        start = perf_counter()
+        for demand in test_stream:
+            test_meyerson.Add_Demand(demand)
+        print(f"{name}: \t{len(test_meyerson.facilities)} Facilities \t{test_meyerson.total_cost} Costs "
+              f"\t{Calculate_Costs(list(test_meyerson.facilities), test_cost)} recomputed \t{np.around(perf_counter() - start, 3)} sec.")
+
+    # the orders of the grid stay the indices in the list while refinements close facilities.
+    assert all(test_meyerson.facilities[order] is facility for grid_cell in test_meyerson.facilities.cells.values()
+               for order, facility in zip(grid_cell.orders, grid_cell.facilities))
+
+    # Add_Many makes the decisions and refinements of Add_Demand, its indices are valid at the arrival.
+    rd.seed(1)
+    test_many = Meyerson_Refined(test_area, test_cost, 1)
+    test_index, test_costs = test_many.Add_Many(As_Coordinates(test_stream))
+    assert (test_many.total_cost, test_many.refinements, len(test_many.facilities)) == \
+           (test_meyerson.total_cost, test_meyerson.refinements, len(test_meyerson.facilities))
+    refinements = test_many.refinements
+    test_index, test_costs = test_many.Add_Many(As_Coordinates(test_stream[:20]))
+    if test_many.refinements == refinements:
+        assert all(test_many.facilities[k] is demand.facility for k, demand in zip(test_index, test_many.demands[-20:]))
+
+    test_lloyd = Lloyd_Clustering_Vectorized(test_area, test_stream)
+    print(f"lloyd: \t\t{len(test_lloyd)} Facilities \t{Calculate_Costs(test_lloyd, test_cost)} Costs")
+    print(f"refinements: {test_meyerson.refinements}")
@@ -0,0 +1,334 @@
+import json
+import asyncio
+import numpy as np
+import Metrics
+from time import perf_counter
+from Meyerson_Class import Meyerson
+
+""" Protocol """
+
+# newline delimited text: every request line is one demand, its coordinates separated by spaces or commas.
+# every demand is answered with one line "<facility> <cost>", the index of the serving facility and the
+# incremental cost, in the order of the requests. invalid lines are answered with "error <reason>".
+# the line "stats" is answered with the latency statistics as a json line.
+
+# parses a block of complete lines, returns the (m, d) coordinates of the valid ones and the errors by line.
+def Parse_Lines(lines: list, dimension: int) -> tuple:
+    try:
+        coordinates = np.array([line.replace(b",", b" ").split() for line in lines], dtype=np.float64)
+        if coordinates.ndim == 2 and coordinates.shape[1] == dimension and np.all(np.isfinite(coordinates)):
+            return (coordinates, {})
+    except ValueError:
+        pass
+
+    # slow path, line by line.
+    rows, errors = [], {}
+    for i, line in enumerate(lines):
+        try:
+            row = [float(x) for x in line.replace(b",", b" ").split()]
+        except ValueError:
+            errors[i] = "error not a number"
+            continue
+        if len(row) != dimension:
+            errors[i] = f"error expected {dimension} coordinates"
+            continue
+        if not np.all(np.isfinite(row)):
+            errors[i] = "error not finite"
+            continue
+        rows.append(row)
+    return (np.array(rows, dtype=np.float64).reshape(-1, dimension), errors)
+
+# the reply lines of a block, the answers of the valid lines with the errors in between.
+def Format_Replies(facility_index: np.ndarray, costs: np.ndarray, errors: dict) -> bytes:
+    replies = [f"{facility} {cost}" for facility, cost in zip(facility_index.tolist(), costs.tolist())]
+    for i in sorted(errors):
+        replies.insert(i, errors[i])
+    return ("\n".join(replies) + "\n").encode() if len(replies) > 0 else b""
+
+
+""" Classes Service """
+
+# asyncio service around one Meyerson instance. the connections parse their requests into blocks and put
+# them into a bounded queue, a single engine task takes up to batch_size demands at once and adds them with
+# Add_Many. a full queue stops the connections from reading (backpressure through the socket), a slow
+# client stops its own connection from reading until its replies are written.
+class Meyerson_Service:
+    def __init__(self, meyerson: Meyerson, dimension: int = 2, batch_size: int = 4096, max_pending: int = 64,
+                 read_size: int = 65536, latency_window: int = 65536) -> None:
+        self.meyerson = meyerson
+        self.dimension = dimension
+        self.batch_size = batch_size
+        self.read_size = read_size
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        # seconds from receiving a demand to writing its reply, and demands per engine batch.
+        self.latency = Metrics.Histogram()
+        self.batches = Metrics.Histogram(Metrics.Count_Buckets)
+        # the exact latencies of the last latency_window demands as a ring, for the quantiles of Stats.
+        self.recent = np.zeros(max(latency_window, 1), dtype=np.float64)
+        self.recent_next = 0
+        self.recent_size = 0
+        self.processed = 0
+        self.connections = set()
+        self.engine = None
+        self.server = None
+
+    async def Start(self, host: str = "127.0.0.1", port: int = 0, path: str = None) -> None:
+        self.engine = asyncio.create_task(self.Run_Engine())
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.Handle_Connection, path=path)
+        else:
+            self.server = await asyncio.start_server(self.Handle_Connection, host, port)
+
+    # (host, port) of the tcp server, or the path of the unix socket.
+    def Address(self):
+        return self.server.sockets[0].getsockname()
+
+    # stops accepting, gives the open connections timeout seconds to finish and cancels the rest.
+    async def Stop(self, timeout: float = 5) -> None:
+        self.server.close()
+        if len(self.connections) > 0:
+            await asyncio.wait(self.connections, timeout=timeout)
+        for connection in list(self.connections):
+            connection.cancel()
+        await self.queue.join()
+        self.engine.cancel()
+
+    # the latency quantiles are exact over the last latency_window demands.
+    def Stats(self) -> dict:
+        recent = self.recent[:self.recent_size]
+        p50, p99 = np.percentile(recent, [50, 99]).tolist() if len(recent) > 0 else (float("nan"), float("nan"))
+        return {"processed": self.processed, "pending": self.queue.qsize(), "p50": p50,
+                "p99": p99, "mean_batch": self.batches.sum / max(self.batches.count, 1),
+                "facilities": len(self.meyerson.facilities), "total_cost": float(self.meyerson.total_cost)}
+
+    async def Handle_Connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections.add(asyncio.current_task())
+        rest = b""
+        try:
+            while len(data := await reader.read(self.read_size)) > 0:
+                received = perf_counter()
+                lines = (rest + data).split(b"\n")
+                rest = lines.pop()
+                await self.Submit(lines, writer, received)
+                # replies of this connection pile up, wait for the client before reading more.
+                await writer.drain()
+            if len(rest.strip()) > 0:
+                await self.Submit([rest], writer, perf_counter())
+            # the engine answers this marker after the last reply of the connection.
+            done = asyncio.get_running_loop().create_future()
+            await self.queue.put((None, writer, None, done))
+            await done
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def Submit(self, lines: list, writer: asyncio.StreamWriter, received: float) -> None:
+        lines = [line for line in lines if len(line.strip()) > 0]
+        start = 0
+        for i, line in enumerate(lines):
+            # the stats request is answered in order, after the demands before it.
+            if line.strip() == b"stats":
+                await self.Submit_Block(lines[start:i], writer, received)
+                await self.queue.put((None, writer, received, "stats"))
+                start = i + 1
+        await self.Submit_Block(lines[start:], writer, received)
+
+    async def Submit_Block(self, lines: list, writer: asyncio.StreamWriter, received: float) -> None:
+        if len(lines) > 0:
+            coordinates, errors = Parse_Lines(lines, self.dimension)
+            await self.queue.put((coordinates, writer, received, errors))
+
+    # takes the waiting blocks up to batch_size demands, adds them in one Add_Many call and writes the replies.
+    async def Run_Engine(self) -> None:
+        while True:
+            blocks = [await self.queue.get()]
+            size = len(blocks[0][0]) if blocks[0][0] is not None else 0
+            while size < self.batch_size and not self.queue.empty():
+                blocks.append(self.queue.get_nowait())
+                size += len(blocks[-1][0]) if blocks[-1][0] is not None else 0
+
+            try:
+                self.Process(blocks, size)
+            except Exception as error:
+                # a failing batch is answered with errors, the engine keeps serving the other blocks.
+                self.Fail(blocks, f"error batch failed: {str(error).strip()}")
+            finally:
+                for block in blocks:
+                    self.queue.task_done()
+            # lets the connections read while the engine has nothing to do.
+            await asyncio.sleep(0)
+
+    def Process(self, blocks: list, size: int) -> None:
+        coordinates = [block[0] for block in blocks if block[0] is not None and len(block[0]) > 0]
+        if len(coordinates) > 0:
+            coordinates = np.concatenate(coordinates)
+            # checked before Add_Many, so a bad batch leaves the facilities and costs untouched.
+            if coordinates.ndim != 2 or coordinates.shape[1] != self.dimension or not np.all(np.isfinite(coordinates)):
+                raise Exception(f"\n\tThe batch contains invalid coordinates.")
+            facility_index, costs = self.meyerson.Add_Many(coordinates)
+        offset = 0
+        done = perf_counter()
+
+        for coordinates, writer, received, errors in blocks:
+            # commands: the stats request or the marker of a closing connection.
+            if coordinates is None:
+                if errors == "stats":
+                    writer.write((json.dumps(self.Stats()) + "\n").encode())
+                elif not errors.done():
+                    errors.set_result(None)
+                continue
+            m = len(coordinates)
+            if not writer.is_closing():
+                writer.write(Format_Replies(facility_index[offset:offset + m] if m > 0 else np.empty(0),
+                                            costs[offset:offset + m] if m > 0 else np.empty(0), errors))
+            offset += m
+            self.latency.Observe(done - received, m)
+            self.Record_Latency(done - received, m)
+            if Metrics.Enabled and m > 0:
+                Metrics.Observe("service_latency_seconds", done - received)
+
+        self.processed += size
+        self.batches.Observe(size)
+        if Metrics.Enabled:
+            Metrics.Increment("service_demands", size)
+            Metrics.Observe("service_batch_size", size, Metrics.Count_Buckets)
+
+    # the demands of a block share their latency, it is written count times into the ring.
+    def Record_Latency(self, value: float, count: int) -> None:
+        count = min(count, len(self.recent))
+        self.recent[(self.recent_next + np.arange(0, count)) % len(self.recent)] = value
+        self.recent_next = (self.recent_next + count) % len(self.recent)
+        self.recent_size = min(self.recent_size + count, len(self.recent))
+
+    # answers every demand of the blocks with the error, the commands as usual.
+    def Fail(self, blocks: list, reason: str) -> None:
+        for coordinates, writer, received, errors in blocks:
+            if coordinates is None:
+                if errors == "stats":
+                    writer.write((json.dumps(self.Stats()) + "\n").encode())
+                elif not errors.done():
+                    errors.set_result(None)
+            elif not writer.is_closing():
+                lines = len(coordinates) + len(errors)
+                writer.write("".join(f"{reason}\n" for i in range(0, lines)).encode())
+        if Metrics.Enabled:
+            Metrics.Increment("service_failed_batches")
+
+
+""" Client """
+
+# sends the coordinates over one connection with at most window demands in flight, returns the replies
+# as the facility index and incremental cost arrays and the latency of every demand.
+async def Send_Demands(coordinates: np.ndarray, host: str = "127.0.0.1", port: int = None, path: str = None,
+                       window: int = 8192, chunk_size: int = 1024) -> tuple:
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    size = len(coordinates)
+    facility_index = np.empty(size, dtype=np.int64)
+    costs = np.empty(size, dtype=np.float64)
+    sent = np.empty(size, dtype=np.float64)
+    latency = np.empty(size, dtype=np.float64)
+    window_free = asyncio.Semaphore(max(window // chunk_size, 1))
+
+    async def Write_Requests() -> None:
+        for start in range(0, size, chunk_size):
+            await window_free.acquire()
+            block = coordinates[start:start + chunk_size]
+            sent[start:start + len(block)] = perf_counter()
+            writer.write(("\n".join(" ".join(repr(x) for x in row) for row in block.tolist()) + "\n").encode())
+            await writer.drain()
+
+    async def Read_Replies() -> None:
+        for i in range(0, size):
+            line = (await reader.readline()).split()
+            if line[0] == b"error":
+                raise Exception(f"\n\tDemand {i} was rejected: {b' '.join(line).decode()}.")
+            facility_index[i], costs[i] = int(line[0]), float(line[1])
+            latency[i] = perf_counter() - sent[i]
+            if (i + 1) % chunk_size == 0:
+                window_free.release()
+
+    await asyncio.gather(Write_Requests(), Read_Replies())
+    writer.close()
+    await writer.wait_closed()
+    return (facility_index, costs, latency)
+
+async def Request_Stats(host: str = "127.0.0.1", port: int = None, path: str = None) -> dict:
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"stats\n")
+    stats = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return stats
+
+
+Metrics.Default.Describe("service_latency_seconds", "Time from receiving a demand to writing its reply.")
+Metrics.Default.Describe("service_batch_size", "Demands added by one Add_Many call of the service.")
+Metrics.Default.Describe("service_demands_total", "Demands added by the service.")
+Metrics.Default.Describe("service_failed_batches_total", "Engine batches answered with errors.")
+
+
+if __name__ == "__main__":
+    import random as rd
+    from Facility_Class import Demand, Generate_Stream
+
+    test_area = (1000, 1000)
+    test_cost = 25
+    test_size = 100000
+    test_coordinates = np.array([demand.position for demand in Generate_Stream(test_size, test_area)], dtype=np.float64)
+
+    async def Test_Service() -> tuple:
+        rd.seed(1)
+        service = Meyerson_Service(Meyerson(test_area, test_cost, 1))
+        await service.Start()
+        port = service.Address()[1]
+
+        start = perf_counter()
+        facility_index, costs, latency = await Send_Demands(test_coordinates, port=port, window=2048, chunk_size=256)
+        service_time = perf_counter() - start
+
+        # errors are answered in order, between the valid demands.
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"1 2 3\nabc\n5,5\nnan 3\ninf 1\n4 5\n")
+        replies = [(await reader.readline()).decode().strip() for i in range(0, 6)]
+        writer.close()
+        assert [reply.startswith("error") for reply in replies] == [True, True, False, True, True, False]
+
+        # a batch failing in the engine is answered with errors, the engine keeps running.
+        failing = asyncio.get_running_loop().create_future()
+        await service.queue.put((np.array([[np.nan, 1.0]]), writer, perf_counter(), {}))
+        await service.queue.put((None, writer, None, failing))
+        await asyncio.wait_for(failing, timeout=5)
+        assert not service.engine.done()
+
+        stats = await Request_Stats(port=port)
+        await service.Stop()
+        return (facility_index, costs, latency, service_time, stats)
+
+    facility_index, costs, latency, service_time, stats = asyncio.run(Test_Service())
+
+    # the service has to make the decisions of Add_Demand with the same seed.
+    rd.seed(1)
+    test_meyerson = Meyerson(test_area, test_cost, 1)
+    start = perf_counter()
+    for position in test_coordinates.tolist():
+        test_meyerson.Add_Demand(Demand(tuple(position)))
+    call_time = perf_counter() - start
+    # a demand opened a facility if it is served by a new one.
+    opened = facility_index > np.maximum.accumulate(np.concatenate(([-1], facility_index[:-1])))
+    assert np.sum(opened) == len(test_meyerson.facilities)
+    assert np.array_equal(np.where(opened, 0, costs), np.array(test_meyerson.facilities.ledger.distances))
+
+    print(f"service: \t{int(test_size / service_time)} demands/sec. \tclient latency p50 "
+          f"{np.around(np.percentile(latency, 50) * 1000, 3)} ms \tp99 {np.around(np.percentile(latency, 99) * 1000, 3)} ms")
+    print(f"Add_Demand: \t{int(test_size / call_time)} demands/sec.")
+    print(f"server stats: \t{stats}")
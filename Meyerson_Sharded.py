@@ -0,0 +1,114 @@
+import os
+import random as rd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from Facility_Store import Demand_Store
+from Facility_Index import Facility_Grid
+from Distance_Kernel import As_Coordinates
+from Meyerson_Class import Meyerson
+
+""" Helper Functions """
+
+# tile of every demand when the area is split into tiles[i] equal parts along dimension i.
+def Tile_Index(coordinates: np.ndarray, area: tuple, tiles: tuple) -> np.ndarray:
+    tiles = np.array(tiles)
+    cell = np.floor(coordinates / (np.array(area, dtype=np.float64) + 1) * tiles).astype(np.int64)
+    cell = np.clip(cell, 0, tiles - 1)
+    return np.ravel_multi_index(tuple(cell.T), tuple(tiles))
+
+# distance of every demand to the closest inner border of its tile.
+def Border_Distance(coordinates: np.ndarray, area: tuple, tiles: tuple) -> np.ndarray:
+    width = (np.array(area, dtype=np.float64) + 1) / np.array(tiles)
+    offset = coordinates - np.floor(coordinates / width) * width
+    inner = np.where(np.array(tiles) > 1, np.minimum(offset, width - offset), np.inf)
+    return np.min(inner, axis=1)
+
+# runs one independent Meyerson instance on the demands of a tile (in arrival order).
+def Run_Shard(arguments: tuple) -> tuple:
+    coordinates, area, cost, q, seed = arguments
+    rd.seed(seed)
+    meyerson = Meyerson(area, cost, q)
+    facility_index, costs = meyerson.Add_Many(coordinates)
+    # the demand opening a facility pays the opening costs, its connection is 0.
+    distances = costs.copy()
+    distances[Opening_Demands(facility_index)] = 0
+    return (As_Coordinates(meyerson.facilities), facility_index, distances)
+
+# index of the first demand served by each facility, i.e. the demand that opened it.
+def Opening_Demands(facility_index: np.ndarray) -> np.ndarray:
+    _, first = np.unique(facility_index, return_index=True)
+    return first
+
+
+""" Sharded Meyerson """
+
+# Meyerson's algorithm split into independent workers, one per tile of the area. the demands are routed by
+# position and keep their arrival order within a tile. the merge step collects all facilities and lets demands
+# close to a tile border switch to a cheaper facility of a neighbouring tile.
+# returns the facility coordinates, the facility of every demand, the distances and the total cost.
+def Sharded_Meyerson(coordinates: np.ndarray, area: tuple, cost: int, q: float = 0.5, tiles: tuple = (2, 2),
+                     seed: int = 0, workers: int = None) -> tuple:
+    coordinates = As_Coordinates(coordinates)
+    tile = Tile_Index(coordinates, area, tiles)
+    members = [np.nonzero(tile == t)[0] for t in range(0, int(np.prod(tiles)))]
+    seeds = [int(child.generate_state(1, dtype=np.uint64)[0]) for child in np.random.SeedSequence(seed).spawn(len(members))]
+    arguments = [(coordinates[indices], area, cost, q, shard_seed) for indices, shard_seed in zip(members, seeds) if len(indices) > 0]
+
+    workers = max(1, workers if workers is not None else (os.cpu_count() or 1))
+    if workers == 1:
+        shards = [Run_Shard(item) for item in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shards = list(executor.map(Run_Shard, arguments))
+
+    # merge: global facility ids and the assignments of all tiles.
+    facilities = [np.zeros((0, coordinates.shape[1]))]
+    assignment = np.empty(len(coordinates), dtype=np.int64)
+    distances = np.empty(len(coordinates), dtype=np.float64)
+    offset = 0
+    for indices, (shard_facilities, facility_index, shard_distances) in zip([m for m in members if len(m) > 0], shards):
+        facilities.append(shard_facilities)
+        assignment[indices] = facility_index + offset
+        distances[indices] = shard_distances
+        offset += len(shard_facilities)
+    facilities = np.concatenate(facilities)
+
+    Reconnect_Border_Demands(coordinates, facilities, assignment, distances, Border_Distance(coordinates, area, tiles), cost)
+    total_cost = np.around(len(facilities) * cost + np.sum(distances), decimals=2)
+    return (facilities, assignment, distances, total_cost)
+
+# demands closer to their tile border than to their facility may have a cheaper facility across the border.
+def Reconnect_Border_Demands(coordinates: np.ndarray, facilities: np.ndarray, assignment: np.ndarray,
+                             distances: np.ndarray, border: np.ndarray, cost: int) -> None:
+    store = Demand_Store(facilities.shape[1])
+    index = Facility_Grid(cost, [store.Open_Facility(position) for position in facilities])
+    for i in np.nonzero(border < distances)[0]:
+        norm, order, _ = index.Search(tuple(coordinates[i].tolist()))
+        if norm < distances[i]:
+            assignment[i], distances[i] = order, norm
+
+# sharded cost divided by the cost of a single Meyerson instance on the same stream (averaged over runs).
+def Sharding_Degradation(coordinates: np.ndarray, area: tuple, cost: int, q: float = 0.5, tiles: tuple = (2, 2),
+                         runs: int = 5, workers: int = None) -> float:
+    sharded, single = 0, 0
+    for run in range(0, runs):
+        sharded += Sharded_Meyerson(coordinates, area, cost, q, tiles, seed=run, workers=workers)[3]
+        rd.seed(run)
+        meyerson = Meyerson(area, cost, q)
+        _, costs = meyerson.Add_Many(coordinates)
+        single += np.sum(costs)
+    return sharded / single
+
+
+if __name__ == "__main__":
+    from Facility_Class import Generate_Stream
+
+    test_area = (400, 400)
+    test_cost = 25
+    test_coordinates = As_Coordinates(Generate_Stream(20000, test_area))
+
+    # the sharded run may only cost a few percent more than the unsharded one.
+    for test_tiles in [(2, 2), (4, 4)]:
+        degradation = Sharding_Degradation(test_coordinates, test_area, test_cost, 1, test_tiles, runs=3)
+        print(f"tiles {test_tiles}: \tcost ratio {np.around(degradation, 4)}")
+        assert degradation < 1.1
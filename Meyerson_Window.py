@@ -0,0 +1,313 @@
+import random as rd
+import numpy as np
+from time import perf_counter
+from Facility_Class import Demand, Cost_Ledger
+from Meyerson_Class import Meyerson
+from Meyerson_Algorithm import q_Get_Probability
+from Facility_Index import Facility_Grid
+from Distance_Kernel import As_Coordinates, Point_Distances, Pairwise_Distances
+
+""" Classes Window """
+
+# facility of the window, it counts its live demands and keeps their ring slots instead of a service list.
+class Window_Facility:
+    __slots__ = ("position", "id", "count", "slots")
+
+    def __init__(self, position: tuple, id: int) -> None:
+        self.position = position
+        self.id = id
+        self.count = 1
+        self.slots = set()
+
+
+# ledger of the live demands: opened counts the open facilities, connection_cost the distances of the live
+# demands. nothing is kept per demand, so Calculate_Costs works on the window without growing memory.
+class Window_Ledger(Cost_Ledger):
+    def Open(self) -> None:
+        self.opened += 1
+        self.mutations += 1
+
+    def Connect(self, distance: float) -> None:
+        self.connection_cost += distance
+
+    def Disconnect(self, distance: float) -> None:
+        self.connection_cost -= distance
+
+
+# live demands of the window in arrival order, as a ring over fixed arrays: position, serving facility
+# id, connection distance (0 for the opener) and arrival time. a fixed capacity keeps the memory flat,
+# without one (time window) the arrays double when they are full, like Grow_Array.
+class Demand_Ring:
+    def __init__(self, dimension: int = 2, capacity: int = 1024, fixed: bool = False) -> None:
+        self.fixed = fixed
+        self.positions = np.zeros((capacity, dimension), dtype=np.float64)
+        self.facilities = np.full(capacity, -1, dtype=np.int64)
+        self.distances = np.zeros(capacity, dtype=np.float64)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def Full(self) -> bool:
+        return self.size == len(self.facilities)
+
+    # appends the newest demand, returns its slot.
+    def Push(self, position: tuple, facility_id: int, distance: float, time: float) -> int:
+        if self.Full():
+            if self.fixed:
+                raise Exception(f"\n\tThe ring is full ({self.size} demands).")
+            self.Grow()
+        slot = (self.head + self.size) % len(self.facilities)
+        self.positions[slot] = position
+        self.facilities[slot] = facility_id
+        self.distances[slot] = distance
+        self.times[slot] = time
+        self.size += 1
+        return slot
+
+    # removes the oldest demand, returns its (slot, facility id, distance).
+    def Pop(self) -> tuple:
+        slot = self.head
+        item = (slot, int(self.facilities[slot]), float(self.distances[slot]))
+        self.facilities[slot] = -1
+        self.head = (self.head + 1) % len(self.facilities)
+        self.size -= 1
+        return item
+
+    def Oldest_Time(self) -> float:
+        return float(self.times[self.head])
+
+    # doubles the capacity, the live demands start at slot 0 again.
+    def Grow(self) -> None:
+        order = self.Slots()
+        capacity = 2 * len(self.facilities)
+        for name, fill in [("positions", 0), ("facilities", -1), ("distances", 0), ("times", 0)]:
+            array = getattr(self, name)
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:self.size] = array[order]
+            setattr(self, name, grown)
+        self.head = 0
+
+    # slots of the live demands in arrival order.
+    def Slots(self) -> np.ndarray:
+        return (self.head + np.arange(0, self.size)) % len(self.facilities)
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        return self.positions[self.Slots()]
+
+
+""" Classes Algorithm """
+
+# Meyerson's online algorithm over a sliding window of the stream. only the last window demands (count
+# based) or the demands of the last duration time units (time based) are kept, the older ones expire.
+# total_cost is |F|*f + \sum d(F, u) over the live demands and updated with every arrival and expiry.
+# a facility whose live demands drop below min_service is closed if it has none left, otherwise its
+# demands are merged into the nearest facilities around it if that lowers the cost. the decisions on
+# arrival are the ones of Meyerson.Add_Demand, with the open facilities of the window.
+class Meyerson_Window(Meyerson):
+    def __init__(self, area: tuple = (10, 10), cost: int = 5, q: float = 0.5, window: int = None, duration: float = None,
+                 min_service: int = 1) -> None:
+        if window is None and duration is None:
+            raise Exception(f"\n\tEither window or duration has to be set.")
+        super().__init__(area, cost, q)
+        self.window = window
+        self.duration = duration
+        self.min_service = max(min_service, 1)
+        self.ring = Demand_Ring(len(area), window if window is not None else 1024, window is not None)
+        self.demands = self.ring
+        self.facilities = Facility_Grid(cost)
+        self.facilities.ledger = Window_Ledger()
+        self.by_id = {}
+        self.next_id = 0
+        self.arrivals = 0
+        self.closed = 0
+        self.merged = 0
+
+    # time is the arrival time for a time window, the arrival count if omitted.
+    def Add_Demand(self, demand: Demand, time: float = None) -> None:
+        self.Add(demand.position, time, rd.random())
+
+    # adds a block of arrivals with the coin flips drawn up front, like Meyerson.Add_Many.
+    # returns the id of the serving facility and the incremental cost of every arrival.
+    def Add_Many(self, coordinates: np.ndarray, times: np.ndarray = None) -> tuple:
+        coordinates = np.asarray(coordinates)
+        coins = [rd.random() for i in range(0, len(coordinates))]
+        facility_ids = np.empty(len(coordinates), dtype=np.int64)
+        costs = np.empty(len(coordinates), dtype=np.float64)
+        for i, position in enumerate(coordinates.tolist()):
+            facility_ids[i], costs[i] = self.Add(tuple(position), None if times is None else float(times[i]), coins[i])
+        return (facility_ids, costs)
+
+    def Add(self, position: tuple, time: float, coin: float) -> tuple:
+        time = float(self.arrivals) if time is None else time
+        self.arrivals += 1
+        self.Expire(time)
+
+        norm, order, facility = self.facilities.Search(position)
+        ledger = self.facilities.ledger
+        if coin < q_Get_Probability(self.q_value, norm, self.faclility_cost):
+            facility = Window_Facility(position, self.next_id)
+            self.next_id += 1
+            self.by_id[facility.id] = facility
+            self.facilities.append(facility)
+            ledger.Open()
+            norm, cost = 0, self.faclility_cost
+        else:
+            facility.count += 1
+            ledger.Connect(norm)
+            cost = norm
+        self.Push(position, facility, norm, time)
+
+        # the running sum is recomputed once per window, so the rounding errors do not pile up.
+        if self.arrivals % len(self.ring.facilities) == 0:
+            ledger.connection_cost = float(np.sum(self.ring.distances[self.ring.Slots()]))
+        self.total_cost = np.around(ledger.Total(self.faclility_cost), decimals= 3)
+        return (facility.id, cost)
+
+    # pushes a demand into the ring and records its slot at the facility. the slots are only needed to merge,
+    # so with min_service 1 they are not kept. when the ring grows, the live demands start at slot 0 again
+    # and the slots of all facilities are moved along.
+    def Push(self, position: tuple, facility: Window_Facility, distance: float, time: float) -> None:
+        head, capacity = self.ring.head, len(self.ring.facilities)
+        slot = self.ring.Push(position, facility.id, distance, time)
+        if self.min_service == 1:
+            return
+        if len(self.ring.facilities) != capacity:
+            for item in self.by_id.values():
+                item.slots = {(old - head) % capacity for old in item.slots}
+        facility.slots.add(slot)
+
+    # expires the demands that left the window before the arrival at time.
+    def Expire(self, time: float) -> None:
+        ring = self.ring
+        while ring.size > 0 and ((self.window is not None and ring.size >= self.window)
+                                 or (self.duration is not None and ring.Oldest_Time() <= time - self.duration)):
+            slot, facility_id, distance = ring.Pop()
+            facility = self.by_id[facility_id]
+            facility.count -= 1
+            facility.slots.discard(slot)
+            self.facilities.ledger.Disconnect(distance)
+            if facility.count < self.min_service:
+                self.Shrink(facility)
+
+    # closes an empty facility, merges a small one into its neighbours if the cost goes down.
+    def Shrink(self, facility: Window_Facility) -> None:
+        if facility.count == 0:
+            self.Close(facility)
+            self.closed += 1
+            return
+
+        neighbours = [item for item in self.facilities.Neighbours(facility.position) if item is not facility]
+        if len(neighbours) == 0:
+            return
+        slots = np.fromiter(facility.slots, dtype=np.int64, count=len(facility.slots))
+        distances = Pairwise_Distances(self.ring.positions[slots], As_Coordinates(neighbours), 4)
+        nearest = np.argmin(distances, axis=1)
+        new_distances = distances[np.arange(0, len(slots)), nearest]
+        old_distances = self.ring.distances[slots]
+        if np.sum(new_distances) - np.sum(old_distances) >= self.faclility_cost:
+            return
+
+        ledger = self.facilities.ledger
+        for slot, k, distance in zip(slots.tolist(), nearest.tolist(), new_distances.tolist()):
+            self.ring.facilities[slot] = neighbours[k].id
+            neighbours[k].count += 1
+            neighbours[k].slots.add(slot)
+        ledger.Disconnect(float(np.sum(old_distances)))
+        ledger.Connect(float(np.sum(new_distances)))
+        self.ring.distances[slots] = new_distances
+        facility.count = 0
+        facility.slots.clear()
+        self.Close(facility)
+        self.merged += 1
+
+    def Close(self, facility: Window_Facility) -> None:
+        self.facilities.remove(facility)
+        del self.by_id[facility.id]
+        self.facilities.ledger.Close()
+
+    # facility id of every live demand in arrival order.
+    def Assignments(self) -> np.ndarray:
+        return self.ring.facilities[self.ring.Slots()]
+
+    # total cost of the live demands, recomputed from the positions.
+    def Recompute_Cost(self) -> float:
+        slots = self.ring.Slots()
+        centers = {facility.id: facility.position for facility in self.facilities}
+        distances = [Point_Distances(self.ring.positions[slot], [centers[int(self.ring.facilities[slot])]], 4)[0] for slot in slots.tolist()]
+        return np.around(len(self.facilities) * self.faclility_cost + np.sum(distances), decimals=3)
+
+
+""" Soak """
+
+# runs a window over a long uniform stream and samples the traced memory every sample_every arrivals.
+# returns the samples (arrivals, live demands, facilities, total cost, traced bytes) and the demands
+# per second. with memory flat in the steady state, the second half of the samples does not grow.
+def Run_Soak(area: tuple, total: int, facility_cost: int = 25, q: float = 1, window: int = 100000,
+             block_size: int = 10000, sample_every: int = 100000, seed: int = 0) -> tuple:
+    import tracemalloc
+    from Demand_Generators import Iterate_Coordinates
+
+    rd.seed(seed)
+    meyerson = Meyerson_Window(area, facility_cost, q, window)
+    samples, arrivals = [], 0
+    tracemalloc.start()
+    start = perf_counter()
+    for block in Iterate_Coordinates(total, area, block_size, seed=seed):
+        meyerson.Add_Many(block)
+        arrivals += len(block)
+        if arrivals % sample_every < len(block):
+            samples.append((arrivals, len(meyerson.ring), len(meyerson.facilities), float(meyerson.total_cost),
+                            tracemalloc.get_traced_memory()[0]))
+    seconds = perf_counter() - start
+    tracemalloc.stop()
+    return (samples, total / seconds)
+
+# relative growth of the traced memory over the second half of the samples.
+def Soak_Growth(samples: list) -> float:
+    steady = [sample[4] for sample in samples[len(samples) // 2:]]
+    return (max(steady) - steady[0]) / steady[0] if len(steady) > 0 else 0
+
+
+if __name__ == "__main__":
+    from Facility_Class import Generate_Stream
+    from Meyerson_Algorithm import Calculate_Costs
+
+    test_area = (300, 300)
+    test_cost = 25
+    test_stream = Generate_Stream(30000, test_area)
+
+    # with a window over the whole stream the decisions are the ones of Meyerson.
+    rd.seed(1)
+    test_meyerson = Meyerson(test_area, test_cost, 1)
+    for demand in test_stream:
+        test_meyerson.Add_Demand(demand)
+    rd.seed(1)
+    test_window = Meyerson_Window(test_area, test_cost, 1, window=len(test_stream))
+    for demand in test_stream:
+        test_window.Add_Demand(demand)
+    assert len(test_window.facilities) == len(test_meyerson.facilities)
+    assert np.isclose(test_window.total_cost, Calculate_Costs(test_meyerson.facilities, test_cost), atol=0.01)
+
+    # the incremental cost has to match the recomputed one, for count and time windows with merging.
+    for window, duration, min_service in [(5000, None, 1), (5000, None, 3), (None, 2500, 3)]:
+        rd.seed(1)
+        test_window = Meyerson_Window(test_area, test_cost, 1, window, duration, min_service)
+        test_window.Add_Many(As_Coordinates(test_stream))
+        assert np.isclose(test_window.total_cost, test_window.Recompute_Cost(), atol=0.01)
+        assert np.isclose(Calculate_Costs(test_window.facilities, test_cost), test_window.total_cost, atol=0.01)
+        assert len(test_window.ring) == (window or int(duration))
+        for facility in test_window.facilities:
+            assert min_service == 1 or facility.slots == set(np.flatnonzero(test_window.ring.facilities == facility.id).tolist())
+            assert min_service == 1 or facility.count == len(facility.slots)
+        print(f"window={window} duration={duration} min_service={min_service}: \t{len(test_window.facilities)} Facilities "
+              f"\t{test_window.total_cost} Costs \tclosed {test_window.closed} \tmerged {test_window.merged}")
+
+    test_samples, test_rate = Run_Soak((300, 300), 500000, window=20000, sample_every=50000)
+    for sample in test_samples:
+        print(f"arrivals {sample[0]:<9}live {sample[1]:<7}facilities {sample[2]:<6}cost {sample[3]:<12}memory {sample[4] / 2**20:.2f} MiB")
+    print(f"{int(test_rate)} demands/sec. \tmemory growth in the steady state: {np.around(100 * Soak_Growth(test_samples), 2)}%")
+    assert Soak_Growth(test_samples) < 0.05
@@ -0,0 +1,192 @@
+import os
+import csv
+import random as rd
+import shutil
+import tempfile
+import numpy as np
+from time import perf_counter
+from itertools import product
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from Distance_Kernel import Point_Distances, Pairwise_Distances, Paired_Distances
+from Demand_Generators import Generate_Coordinates
+from Lloyd_Vectorized import Seed_Kmeans_PP, Lloyd_Iterate
+from Experiment_Runner import Trial_Seeds
+
+""" Classes Results """
+
+# one row of the sweep table. parameters that do not apply to an algorithm are None.
+class Sweep_Row(NamedTuple):
+    trial: int
+    algorithm: str
+    q: float
+    cost: int
+    n_centers: int
+    iteration: int
+    facilities: int
+    total_cost: float
+    seconds: float
+
+
+""" Helper Functions """
+
+# state of the worker process: the shared arrays of every trial, memory-mapped from the sweep directory.
+Worker_State = {}
+
+def Initialize_Worker(directory: str) -> None:
+    Worker_State.clear()
+    Worker_State["directory"] = directory
+
+def Load_Shared(name: str, trial: int) -> np.ndarray:
+    key = (name, trial)
+    if key not in Worker_State:
+        path = os.path.join(Worker_State["directory"], f"{name}_{trial}.npy")
+        Worker_State[key] = np.load(path, mmap_mode="r") if os.path.exists(path) else None
+    return Worker_State[key]
+
+# rounded distances between all demands of a trial, written block by block into a .npy file.
+def Write_Distance_Matrix(path: str, coordinates: np.ndarray, block_size: int = 1024) -> None:
+    matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(len(coordinates), len(coordinates)))
+    for start in range(0, len(coordinates), block_size):
+        matrix[start:start + block_size] = Pairwise_Distances(coordinates[start:start + block_size], coordinates, 4)
+    matrix.flush()
+    del matrix
+
+
+""" Algorithms """
+
+# q_Meyerson_Algorithm_Online on the demand coordinates (facilities are always demands). the distance of every
+# demand to its closest open facility is kept in one column, which is lowered with the distances of a facility
+# when it opens, so an arrival costs O(1) and an opening O(n). the distances of an opened facility are its row of
+# the precomputed matrix or, without a matrix, computed from the coordinates. with rd.Random(seed) as coin
+# source it makes exactly the decisions of q_Meyerson_Algorithm_Online after rd.seed(seed).
+# returns the facility count and the total cost.
+def Meyerson_On_Coordinates(coordinates: np.ndarray, q: float, facility_cost: int, seed: int, distances: np.ndarray = None) -> tuple:
+    coins = rd.Random(seed)
+    nearest = np.full(len(coordinates), np.inf)
+    opened, connection = 0, 0
+
+    for i in range(0, len(coordinates)):
+        norm = nearest[i] if opened > 0 else 10000
+        probability = min(q * np.around(norm / facility_cost, decimals=3), 1)
+
+        if coins.random() < probability:
+            row = distances[i] if distances is not None else Point_Distances(coordinates[i], coordinates, 4)
+            np.minimum(nearest, row, out=nearest)
+            opened += 1
+        else:
+            connection += norm
+
+    return (opened, np.around(opened * facility_cost + connection, decimals=2))
+
+# Lloyd's iterations with k-means++ seeding on the coordinates. the result does not depend on the facility
+# cost, so it is evaluated for all costs at once. returns the facility count and one total cost per cost.
+def Lloyd_On_Coordinates(coordinates: np.ndarray, n_centers: int, iteration: int, costs: list, seed: int) -> tuple:
+    rng = np.random.default_rng(seed)
+    centers, labels, _ = Lloyd_Iterate(coordinates, Seed_Kmeans_PP(coordinates, n_centers, rng), iteration)
+    # rounded centers like Build_Facilities.
+    connection = np.sum(Paired_Distances(coordinates, np.around(centers, decimals=3)[labels], 4))
+    used = len(np.unique(labels))
+    return (used, [np.around(used * cost + connection, decimals=2) for cost in costs])
+
+
+""" Tasks """
+
+# runs one grid point of one trial in the worker, returns its rows.
+def Run_Task(task: tuple) -> list[Sweep_Row]:
+    algorithm, trial, trial_seed, parameters = task
+    coordinates = Load_Shared("coordinates", trial)
+    start = perf_counter()
+
+    if algorithm == "q_meyerson":
+        q, cost = parameters
+        facilities, total_cost = Meyerson_On_Coordinates(coordinates, q, cost, trial_seed, Load_Shared("distances", trial))
+        return [Sweep_Row(trial, algorithm, q, cost, None, None, facilities, float(total_cost), perf_counter() - start)]
+
+    elif algorithm == "lloyd":
+        n_centers, iteration, costs = parameters
+        n_centers = n_centers if n_centers is not None else max(int(np.sqrt(len(coordinates))), 1)
+        facilities, total_costs = Lloyd_On_Coordinates(np.asarray(coordinates), n_centers, iteration, costs, trial_seed)
+        seconds = perf_counter() - start
+        return [Sweep_Row(trial, algorithm, None, cost, n_centers, iteration, facilities, float(total_cost), seconds)
+                for cost, total_cost in zip(costs, total_costs)]
+
+    raise Exception(f"\n\tAlgorithm '{algorithm}' is not valid.")
+
+
+""" Sweep """
+
+# runs q_meyerson for every (q, cost) and lloyd for every (n_centers, iteration) of the grid on trials fixed
+# demand streams. every grid point of a trial uses the same stream and the same seed (common random numbers),
+# so differences between grid points are not hidden by the randomness of the streams. the coordinates and,
+# for streams up to matrix_limit demands, the distance matrix of every trial are computed once and shared
+# with the workers as memory-mapped files. returns the rows sorted by trial and grid point.
+def Run_Sweep(area: tuple, sample_size: int, qs: list = (0.5, 1), costs: list = (25,), n_centers: list = (None,),
+              iterations: list = (10,), trials: int = 1, seed: int = 0, algorithms: tuple = ("q_meyerson", "lloyd"),
+              matrix_limit: int = 5000, workers: int = None) -> list[Sweep_Row]:
+    directory = tempfile.mkdtemp(prefix="parameter_sweep_")
+    try:
+        trial_seeds = Trial_Seeds(seed, trials)
+        for trial, trial_seed in enumerate(trial_seeds):
+            coordinates = Generate_Coordinates(sample_size, area, seed=trial_seed)
+            np.save(os.path.join(directory, f"coordinates_{trial}.npy"), coordinates)
+            if "q_meyerson" in algorithms and sample_size <= matrix_limit:
+                Write_Distance_Matrix(os.path.join(directory, f"distances_{trial}.npy"), coordinates)
+
+        tasks = []
+        for trial, trial_seed in enumerate(trial_seeds):
+            if "q_meyerson" in algorithms:
+                tasks += [("q_meyerson", trial, trial_seed, (q, cost)) for q, cost in product(qs, costs)]
+            if "lloyd" in algorithms:
+                tasks += [("lloyd", trial, trial_seed, (k, iteration, list(costs))) for k, iteration in product(n_centers, iterations)]
+
+        workers = max(1, workers if workers is not None else (os.cpu_count() or 1))
+        if workers == 1:
+            Initialize_Worker(directory)
+            rows = [row for task in tasks for row in Run_Task(task)]
+            Worker_State.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=Initialize_Worker, initargs=(directory,)) as executor:
+                rows = [row for result in executor.map(Run_Task, tasks) for row in result]
+        return rows
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def Write_Sweep(path: str, rows: list[Sweep_Row]) -> None:
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(Sweep_Row._fields)
+        writer.writerows(rows)
+
+def Print_Sweep(rows: list[Sweep_Row]) -> None:
+    print("trial\talgorithm\tq\tcost\tcenters\titer\tfacilities\ttotal_cost\tseconds")
+    for row in rows:
+        print(f"{row.trial}\t{row.algorithm:<10}\t{row.q}\t{row.cost}\t{row.n_centers}\t{row.iteration}\t"
+              f"{row.facilities}\t\t{row.total_cost}\t{np.around(row.seconds, 4)}")
+
+
+if __name__ == "__main__":
+    from Facility_Class import Demand
+    from Meyerson_Algorithm import q_Meyerson_Algorithm_Online, Calculate_Costs
+
+    test_area = (200, 200)
+    test_size = 3000
+
+    start = perf_counter()
+    test_rows = Run_Sweep(test_area, test_size, qs=[0.25, 0.5, 1], costs=[10, 25, 50], n_centers=[None, 100],
+                          iterations=[5, 20], trials=2, seed=3)
+    sweep_time = perf_counter() - start
+    Print_Sweep(test_rows)
+
+    # the sweep has to match q_Meyerson_Algorithm_Online with the same stream and seed.
+    test_seed = Trial_Seeds(3, 2)[1]
+    test_stream = [Demand(tuple(position)) for position in Generate_Coordinates(test_size, test_area, seed=test_seed).tolist()]
+    rd.seed(test_seed)
+    test_result = q_Meyerson_Algorithm_Online(0.5, test_stream, 25)
+    test_row = next(row for row in test_rows if row.trial == 1 and row.algorithm == "q_meyerson" and row.q == 0.5 and row.cost == 25)
+    assert (len(test_result), Calculate_Costs(test_result, 25)) == (test_row.facilities, test_row.total_cost)
+    # without the matrix the distances of the opened facilities are computed from the coordinates.
+    test_coordinates = Generate_Coordinates(test_size, test_area, seed=test_seed)
+    assert Meyerson_On_Coordinates(test_coordinates, 0.5, 25, test_seed) == (test_row.facilities, test_row.total_cost)
+
+    print(f"\n{len(test_rows)} rows in {np.around(sweep_time, 3)} sec.")
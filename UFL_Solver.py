@@ -0,0 +1,264 @@
+import heapq
+import numpy as np
+from itertools import product
+from Facility_Class import Facility, Cost_Ledger, Facility_List
+from Distance_Kernel import As_Coordinates, Pairwise_Distances
+
+""" Helper Functions """
+
+# identical positions are merged into one weighted point, every point is a candidate facility.
+# returns the points, their weights and the point of every demand.
+def Merge_Points(coordinates: np.ndarray) -> tuple:
+    points, inverse, weights = np.unique(coordinates, axis=0, return_inverse=True, return_counts=True)
+    return (points, weights.astype(np.float64), inverse.reshape(-1))
+
+# candidate pairs (candidate, point, distance): for every point its k nearest candidates within radius,
+# including the point itself. found through a grid with cells of size radius, so only neighbouring cells
+# are compared (size 1 for radius 0, where only the point itself is a candidate). the pairs are sorted by
+# point, distance and candidate.
+def Candidate_Pairs(points: np.ndarray, radius: float, k: int = 16) -> tuple:
+    cell_size = radius if radius > 0 else 1
+    cells = np.floor(points / cell_size).astype(np.int64)
+    keys, cell_of_point = np.unique(cells, axis=0, return_inverse=True)
+    cell_of_point = cell_of_point.reshape(-1)
+    order = np.argsort(cell_of_point, kind="stable")
+    offsets = np.searchsorted(cell_of_point[order], np.arange(0, len(keys) + 1))
+    index = {tuple(key): c for c, key in enumerate(keys.tolist())}
+    neighbourhood = list(product((-1, 0, 1), repeat=points.shape[1]))
+
+    candidates, members, distances = [], [], []
+    for c, key in enumerate(keys.tolist()):
+        own = order[offsets[c]:offsets[c + 1]]
+        near = [index[cell] for cell in (tuple(x + o for x, o in zip(key, offset)) for offset in neighbourhood) if cell in index]
+        near = np.concatenate([order[offsets[n]:offsets[n + 1]] for n in near])
+
+        block = Pairwise_Distances(points[own], points[near], 4)
+        block[block > radius] = np.inf
+        if block.shape[1] > k:
+            nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+        else:
+            nearest = np.broadcast_to(np.arange(0, block.shape[1]), block.shape)
+        rows = np.repeat(np.arange(0, len(own)), nearest.shape[1])
+        chosen = block[rows, nearest.ravel()]
+        keep = np.isfinite(chosen)
+        candidates.append(near[nearest.ravel()[keep]])
+        members.append(own[rows[keep]])
+        distances.append(chosen[keep])
+
+    candidates, members, distances = np.concatenate(candidates), np.concatenate(members), np.concatenate(distances)
+    order = np.lexsort((candidates, distances, members))
+    return (candidates[order], members[order], distances[order])
+
+# nearest and second nearest open candidate of every point among its pairs (inf and -1 if there is none).
+# the pairs are sorted by point and distance, so the first two open pairs of a point are the ones.
+def Nearest_Open(pairs: tuple, opened: np.ndarray, size: int) -> tuple:
+    candidates, members, distances = pairs
+    mask = opened[candidates]
+    candidates, members, distances = candidates[mask], members[mask], distances[mask]
+
+    first = np.flatnonzero(np.concatenate(([True], members[1:] != members[:-1])))
+    second = first + 1
+    has_second = second < len(members)
+    has_second[has_second] = members[second[has_second]] == members[first[has_second]]
+
+    assignment = np.full(size, -1, dtype=np.int64)
+    current = np.full(size, np.inf)
+    runner_up = np.full(size, np.inf)
+    assignment[members[first]] = candidates[first]
+    current[members[first]] = distances[first]
+    runner_up[members[first[has_second]]] = distances[second[has_second]]
+    return (assignment, current, runner_up)
+
+
+""" Greedy """
+
+# greedy in the style of Jain, Mahdian and Saberi: repeatedly takes the star (candidate and a set of
+# unassigned points) with the lowest cost per weight, (f + \sum w*d) / \sum w, with f = 0 for open candidates.
+# the best star of a candidate only gets worse as points are assigned, so the stars are kept in a lazy heap
+# and only recomputed when they reach the top.
+def Greedy_Facilities(pairs: tuple, weights: np.ndarray, facility_cost: int) -> np.ndarray:
+    candidates, members, distances = pairs
+    # pairs grouped by candidate, each group sorted by distance.
+    order = np.lexsort((members, distances, candidates))
+    group_members, group_distances = members[order], distances[order]
+    offsets = np.searchsorted(candidates[order], np.arange(0, len(weights) + 1))
+
+    opened = np.zeros(len(weights), dtype=bool)
+    assigned = np.zeros(len(weights), dtype=bool)
+
+    def Best_Star(c: int) -> tuple:
+        star = group_members[offsets[c]:offsets[c + 1]]
+        free = ~assigned[star]
+        if not np.any(free):
+            return (np.inf, None)
+        star, star_weights = star[free], weights[star[free]]
+        ratios = (facility_cost * (not opened[c]) + np.cumsum(group_distances[offsets[c]:offsets[c + 1]][free] * star_weights)) / np.cumsum(star_weights)
+        best = int(np.argmin(ratios))
+        return (ratios[best], star[:best + 1])
+
+    # the first stars of all candidates at once, with cumulative sums over the groups.
+    group_weights = weights[group_members]
+    costs = np.cumsum(group_distances * group_weights)
+    totals = np.cumsum(group_weights)
+    starts = np.repeat(offsets[:-1], np.diff(offsets))
+    costs -= np.concatenate(([0], costs))[starts]
+    totals -= np.concatenate(([0], totals))[starts]
+    ratios = np.full(len(weights), np.inf)
+    np.minimum.at(ratios, candidates[order], (facility_cost + costs) / totals)
+    heap = list(zip(ratios.tolist(), range(0, len(weights))))
+    heapq.heapify(heap)
+    remaining = len(weights)
+    while remaining > 0 and len(heap) > 0:
+        ratio, c = heapq.heappop(heap)
+        ratio, star = Best_Star(c)
+        if star is None:
+            continue
+        if len(heap) > 0 and ratio > heap[0][0]:
+            heapq.heappush(heap, (ratio, c))
+            continue
+
+        opened[c] = True
+        assigned[star] = True
+        remaining -= len(star)
+        heapq.heappush(heap, (Best_Star(c)[0], c))
+
+    return opened
+
+
+""" Local Search """
+
+# add, drop and swap moves on the open candidates. every pass evaluates all add and drop moves at once
+# with the nearest and second nearest open candidate of every point. a move only changes the points within
+# reach of its candidate, so all improving moves that are the best move of every point they reach are
+# independent and applied together. if none improves, the swaps of the swap_candidates best add moves
+# with every open candidate are evaluated.
+def Local_Search(pairs: tuple, weights: np.ndarray, facility_cost: int, opened: np.ndarray, max_passes: int = 1000,
+                 swap_candidates: int = 8) -> np.ndarray:
+    candidates, members, distances = pairs
+    opened = opened.copy()
+    size = len(weights)
+
+    def Add_Deltas(current: np.ndarray) -> np.ndarray:
+        savings = weights[members] * np.maximum(current[members] - distances, 0)
+        deltas = facility_cost - np.bincount(candidates, weights=savings, minlength=size)
+        deltas[opened] = np.inf
+        return deltas
+
+    def Drop_Deltas(assignment: np.ndarray, current: np.ndarray, runner_up: np.ndarray) -> np.ndarray:
+        valid = assignment >= 0
+        # the points of a dropped candidate move to their second nearest one, impossible if there is none.
+        stuck = np.bincount(assignment[valid], weights=np.isinf(runner_up[valid]), minlength=size) > 0
+        moved = valid & np.isfinite(runner_up)
+        loss = np.bincount(assignment[moved], weights=weights[moved] * (runner_up[moved] - current[moved]), minlength=size)
+        deltas = np.where(stuck, np.inf, loss - facility_cost)
+        deltas[~opened] = np.inf
+        return deltas
+
+    for i in range(0, max_passes):
+        assignment, current, runner_up = Nearest_Open(pairs, opened, size)
+        add_deltas = Add_Deltas(current)
+        deltas = np.minimum(add_deltas, Drop_Deltas(assignment, current, runner_up))
+
+        if np.min(deltas) < -1e-6:
+            # rank of every move by delta and candidate, the best rank reaching every point.
+            rank = np.empty(size, dtype=np.int64)
+            rank[np.lexsort((np.arange(0, size), deltas))] = np.arange(0, size)
+            best_rank = np.full(size, size, dtype=np.int64)
+            np.minimum.at(best_rank, members, rank[candidates])
+            beaten = np.bincount(candidates, weights=best_rank[members] != rank[candidates], minlength=size) > 0
+            moves = np.flatnonzero((deltas < -1e-6) & ~beaten)
+            opened[moves] = ~opened[moves]
+            continue
+
+        # swap: open one of the best closed candidates and drop the best open one with it.
+        swapped = False
+        for c in np.argsort(add_deltas)[:swap_candidates]:
+            if not np.isfinite(add_deltas[c]):
+                break
+            opened[c] = True
+            swap_drops = Drop_Deltas(*Nearest_Open(pairs, opened, size))
+            swap_drops[c] = np.inf
+            d = int(np.argmin(swap_drops))
+            if add_deltas[c] + swap_drops[d] < -1e-6:
+                opened[d] = False
+                swapped = True
+                break
+            opened[c] = False
+        if not swapped:
+            break
+
+    return opened
+
+
+""" Solver """
+
+# offline uncapacitated facility location on the objective of Calculate_Costs, |F|*f + \sum d(F, u), with the
+# demand positions as candidate facilities. a connection longer than f is never better than opening a
+# facility at the demand itself, so only candidates within f are considered (the k nearest of them).
+# returns the facility coordinates, the facility of every demand, the distances and the total cost.
+def UFL_Solve(coordinates: np.ndarray, facility_cost: int, k: int = 16, max_passes: int = 1000) -> tuple:
+    coordinates = As_Coordinates(coordinates)
+    points, weights, inverse = Merge_Points(coordinates)
+    pairs = Candidate_Pairs(points, facility_cost, k)
+
+    opened = Greedy_Facilities(pairs, weights, facility_cost)
+    opened = Local_Search(pairs, weights, facility_cost, opened, max_passes)
+    assignment, current, _ = Nearest_Open(pairs, opened, len(points))
+
+    # facility ids in the order of the candidates.
+    facility_ids = np.cumsum(opened) - 1
+    distances = current[inverse]
+    total_cost = np.around(np.sum(opened) * facility_cost + np.sum(distances), decimals=2)
+    return (points[opened], facility_ids[assignment][inverse], distances, total_cost)
+
+# UFL_Solve for a list of Demands, returns the facilities like the other algorithms.
+def UFL_Clustering(demand_list: list, facility_cost: int, k: int = 16, max_passes: int = 1000) -> list[Facility]:
+    if len(demand_list) == 0:
+        return Facility_List(ledger=Cost_Ledger())
+    centers, labels, distances, _ = UFL_Solve(demand_list, facility_cost, k, max_passes)
+
+    order = np.argsort(labels, kind="stable")
+    offsets = np.searchsorted(labels[order], np.arange(0, len(centers) + 1))
+    facilities = Facility_List(ledger=Cost_Ledger())
+    for c, position in enumerate(centers.tolist()):
+        members = order[offsets[c]:offsets[c + 1]]
+        facility = Facility(tuple(position), demand_list[members[0]])
+        for index in members[1:]:
+            facility.Add_Service(demand_list[index])
+        facilities.append(facility)
+
+    facilities.ledger.Attach(facilities)
+    facilities.ledger.Connect_Many(distances[order])
+    return facilities
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from Facility_Class import Generate_Stream
+    from Meyerson_Algorithm import q_Meyerson_Algorithm_Online, Lloyd_Clustering, Calculate_Costs
+    from Demand_Generators import Generate_Gaussian_Mixture
+
+    test_area = (300, 300)
+    test_cost = 25
+    test_stream = Generate_Stream(5000, test_area)
+
+    start = perf_counter()
+    test_ufl = UFL_Clustering(test_stream, test_cost)
+    ufl_time = perf_counter() - start
+    # the ledger has to match the recomputed costs.
+    assert Calculate_Costs(test_ufl, test_cost) == Calculate_Costs(list(test_ufl), test_cost)
+    # free facilities: every distinct position gets its own facility.
+    test_free = UFL_Clustering(test_stream, 0)
+    assert len(test_free) == len(set(demand.position for demand in test_stream)) and Calculate_Costs(test_free, 0) == 0
+
+    test_meyerson = q_Meyerson_Algorithm_Online(0.5, test_stream, test_cost)
+    test_lloyd = Lloyd_Clustering(test_area, test_stream)
+    print(f"ufl: \t\t{len(test_ufl)} Facilities \t{Calculate_Costs(test_ufl, test_cost)} Costs \t{np.around(ufl_time, 3)} sec.")
+    print(f"q-meyerson: \t{len(test_meyerson)} Facilities \t{Calculate_Costs(test_meyerson, test_cost)} Costs")
+    print(f"lloyd: \t\t{len(test_lloyd)} Facilities \t{Calculate_Costs(test_lloyd, test_cost)} Costs")
+
+    # large instance on the arrays only.
+    test_coordinates = Generate_Gaussian_Mixture(100000, (2000, 2000), n_components=20, integer=False, seed=1)
+    start = perf_counter()
+    _, _, _, test_total = UFL_Solve(test_coordinates, test_cost)
+    print(f"ufl 100000: \t{test_total} Costs \t{np.around(perf_counter() - start, 3)} sec.")